@@ -4,6 +4,7 @@ Agent File Converter Package
 Converts agent files between various frameworks like LangChain and AutoGen.
 """
 
-from .af_converter import LangChainConverter, AutoGenConverter
+from .af_converter import LangChainConverter, AutoGenConverter, StreamingAgentFile
+from .af_schema import Message
 
-__all__ = ['LangChainConverter', 'AutoGenConverter'] 
\ No newline at end of file
+__all__ = ['LangChainConverter', 'AutoGenConverter', 'StreamingAgentFile', 'Message']
@@ -0,0 +1,143 @@
+"""
+Content-addressed cache of converted outputs
+
+Converting the same .af file again with the same options gives the same
+output, so the serialized output is stored under a key derived from a hash
+of the input bytes, the target format, the conversion options and the
+converter version. A later conversion with the same key just copies the
+stored bytes to the output path.
+
+Entries are plain files in one directory. Reading an entry refreshes its
+modification time, and when the directory grows beyond `max_bytes` the
+least recently used entries are removed. Each process keeps a running
+total of the directory's size, so the directory is only scanned when that
+total exceeds `max_bytes`, or every `SCAN_INTERVAL` writes to pick up
+entries written by other processes.
+
+The cache only saves work, so a directory that cannot be used (read-only,
+missing permissions, a file in its path) makes reads miss and writes be
+skipped instead of failing the conversion.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+ENTRY_SUFFIX = ".json"
+SCAN_INTERVAL = 256
+
+# Per cache directory: estimated size in bytes and writes since the last scan
+_usage: Dict[str, List[int]] = {}
+
+def default_cache_dir() -> str:
+    """$AF_CACHE_DIR, else af_converter under the user's cache directory"""
+    if os.environ.get("AF_CACHE_DIR"):
+        return os.environ["AF_CACHE_DIR"]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "af_converter")
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's raw bytes"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ConversionCache:
+    """Size-bounded, least recently used store of serialized outputs"""
+    
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+    
+    @staticmethod
+    def key(input_hash: str, output_format: str, options: Dict[str, Any], version: str) -> str:
+        """Cache key of one conversion"""
+        payload = json.dumps([input_hash, output_format, options, version], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored output for `key` and mark it as recently used, or None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return payload
+    
+    def put(self, key: str, payload: bytes) -> bool:
+        """Store the output for `key`, evicting old entries if the cache is full
+        
+        Returns False if the entry could not be written.
+        """
+        path = self._path(key)
+        # Write to a private file first so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            usage = _usage.get(os.path.abspath(self.directory))
+            if usage is None:
+                self.evict()
+            else:
+                # Replaced entries are counted twice, which only brings the next scan forward
+                usage[0] += len(payload)
+                usage[1] += 1
+                if usage[0] > self.max_bytes or usage[1] >= SCAN_INTERVAL:
+                    self.evict()
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        return True
+    
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in `max_bytes`"""
+        entries = []
+        total = 0
+        if not os.path.isdir(self.directory):
+            return
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        
+        # Evict a little below the bound, so that the next writes don't scan again at once
+        target = self.max_bytes if total <= self.max_bytes else self.max_bytes * 9 // 10
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already evicted by another process
+                pass
+            total -= size
+        _usage[os.path.abspath(self.directory)] = [total, 0]
+    
+    def clear(self) -> None:
+        """Remove every entry"""
+        max_bytes, self.max_bytes = self.max_bytes, 0
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
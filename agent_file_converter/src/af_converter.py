@@ -12,165 +12,961 @@ Usage:
 """
 
 import argparse
+import glob
+import gzip
+import io
 import json
+import mmap
 import os
+import re
 import sys
-from typing import Dict, List, Any, Optional, Union
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Any, Optional, TextIO, Tuple, Union
+
+try:
+    from .af_cache import ConversionCache, default_cache_dir, hash_file
+    from .af_schema import Message, SchemaResolver, schema_resolver
+    from .af_stats import ConversionStats
+    from .af_tools import ToolRegistry, share_tools, shared_tools_file
+except ImportError:
+    from af_cache import ConversionCache, default_cache_dir, hash_file
+    from af_schema import Message, SchemaResolver, schema_resolver
+    from af_stats import ConversionStats
+    from af_tools import ToolRegistry, share_tools, shared_tools_file
+
+# Bump whenever the output for the same input and options changes, so that
+# cached conversions made by older versions are not reused
+CONVERTER_VERSION = "1.0"
+
+class AgentFileError(Exception):
+    """Raised when an input .af file cannot be read or parsed"""
+
+class JsonBackend:
+    """Stdlib `json` serialization backend, always available
+    
+    Backends read .af files from bytes and write converted output as bytes.
+    `compact=True` drops indentation and whitespace for machine consumers.
+    """
+    
+    name = "json"
+    decode_errors: Tuple[type, ...] = (json.JSONDecodeError, UnicodeDecodeError)
+    
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+    
+    def loads_buffer(self, buffer: memoryview) -> Any:
+        """Decode from a buffer such as a memory-mapped file
+        
+        The stdlib decoder needs `str`, so the buffer is decoded straight to
+        text without first copying it into an intermediate `bytes` object.
+        """
+        return json.loads(str(buffer, "utf-8"))
+    
+    def dumps(self, obj: Any, compact: bool = False) -> bytes:
+        if compact:
+            return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return json.dumps(obj, indent=2).encode("utf-8")
+
+class OrjsonBackend(JsonBackend):
+    """orjson backend (optional dependency: pip install orjson)"""
+    
+    name = "orjson"
+    
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self.decode_errors = (orjson.JSONDecodeError,)
+    
+    def loads(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+    
+    def loads_buffer(self, buffer: memoryview) -> Any:
+        return self._orjson.loads(buffer)
+    
+    def dumps(self, obj: Any, compact: bool = False) -> bytes:
+        if compact:
+            return self._orjson.dumps(obj)
+        return self._orjson.dumps(obj, option=self._orjson.OPT_INDENT_2)
+
+class MsgspecBackend(JsonBackend):
+    """msgspec backend (optional dependency: pip install msgspec)"""
+    
+    name = "msgspec"
+    
+    def __init__(self):
+        import msgspec
+        self._json = msgspec.json
+        self.decode_errors = (msgspec.DecodeError,)
+    
+    def loads(self, data: bytes) -> Any:
+        return self._json.decode(data)
+    
+    def loads_buffer(self, buffer: memoryview) -> Any:
+        return self._json.decode(buffer)
+    
+    def dumps(self, obj: Any, compact: bool = False) -> bytes:
+        encoded = self._json.encode(obj)
+        if compact:
+            return encoded
+        return self._json.format(encoded, indent=2)
+
+# In order of preference when the backend is chosen automatically
+JSON_BACKENDS = {
+    "orjson": OrjsonBackend,
+    "msgspec": MsgspecBackend,
+    "json": JsonBackend,
+}
+
+def get_json_backend(name: Optional[Union[str, JsonBackend]] = None) -> JsonBackend:
+    """Return a serialization backend by name
+    
+    With no name (or "auto") the AF_JSON_BACKEND environment variable is
+    honoured, otherwise the fastest installed backend is used.
+    """
+    if isinstance(name, JsonBackend):
+        return name
+    if not name or name == "auto":
+        name = os.environ.get("AF_JSON_BACKEND") or "auto"
+    if name == "auto":
+        for backend_class in JSON_BACKENDS.values():
+            try:
+                return backend_class()
+            except ImportError:
+                continue
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {name} (choose from auto, {', '.join(JSON_BACKENDS)})")
+    try:
+        return JSON_BACKENDS[name]()
+    except ImportError as e:
+        raise ImportError(f"JSON backend '{name}' is not installed: pip install {name}") from e
+
+# Compressed containers are detected by magic bytes when reading and chosen
+# by file extension when writing
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSION_EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+def _import_zstandard():
+    """Import the optional zstandard package with a helpful error"""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("Reading or writing .zst files requires zstandard: pip install zstandard") from e
+    return zstandard
+
+def _decompression_errors() -> Tuple[type, ...]:
+    """Exceptions raised while reading a corrupt compressed agent file"""
+    errors: Tuple[type, ...] = (gzip.BadGzipFile, EOFError)
+    # zstandard is optional, and only imported once a .zst file has been opened
+    zstandard = sys.modules.get("zstandard")
+    if zstandard is not None:
+        errors += (zstandard.ZstdError,)
+    return errors
+
+def detect_compression(f: BinaryIO) -> Optional[str]:
+    """Return "gzip", "zstd" or None from the magic bytes of an open file"""
+    position = f.tell()
+    magic = f.read(len(ZSTD_MAGIC))
+    f.seek(position)
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic == ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+def open_agent_file(path: str) -> BinaryIO:
+    """Open an agent file for binary reading
+    
+    gzip and zstd containers are recognised by their magic bytes and
+    decompressed on the fly, so callers read plain JSON bytes either way.
+    """
+    f = open(path, 'rb')
+    try:
+        compression = detect_compression(f)
+        if compression == "gzip":
+            f.close()
+            return gzip.open(path, 'rb')
+        if compression == "zstd":
+            return _import_zstandard().ZstdDecompressor().stream_reader(f, closefd=True)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+# Uncompressed files at least this large are parsed from a memory map
+MMAP_THRESHOLD = 1024 * 1024
+
+def read_agent_data(path: str, json_backend: JsonBackend, use_mmap: Optional[bool] = None) -> Any:
+    """Read and decode a whole agent file
+    
+    Uncompressed files are memory-mapped and handed to the decoder as a
+    buffer, avoiding the copy into a `bytes` object that `read()` makes.
+    `use_mmap=None` maps only files of at least MMAP_THRESHOLD bytes.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap is None:
+            use_mmap = size >= MMAP_THRESHOLD
+        if use_mmap and size > 0 and detect_compression(f) is None:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # The view must be released before the map can be closed
+                with memoryview(mapped) as buffer:
+                    return json_backend.loads_buffer(buffer)
+    
+    with open_agent_file(path) as f:
+        return json_backend.loads(f.read())
+
+def open_output_file(path: str) -> BinaryIO:
+    """Open an output file for binary writing, compressing by extension"""
+    if path.endswith(COMPRESSION_EXTENSIONS["gzip"]):
+        return gzip.open(path, 'wb')
+    if path.endswith(COMPRESSION_EXTENSIONS["zstd"]):
+        zstandard = _import_zstandard()
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, 'wb')
+
+def write_output(path: str, payload: bytes) -> None:
+    """Write serialized output to `path`, compressing by extension"""
+    with open_output_file(path) as f:
+        f.write(payload)
+
+def _open_agent_text(path: str) -> TextIO:
+    """Open an agent file as UTF-8 text, decompressing if needed"""
+    return io.TextIOWrapper(open_agent_file(path), encoding='utf-8')
+
+class _JsonStream:
+    """Minimal pull parser over a JSON text file
+
+    Containers we want to walk piecewise (the top-level object and the
+    `messages` array) are tokenized by hand; every other value is handed to
+    the C decoder via `raw_decode`, so only one value is held at a time.
+    """
+    
+    _WHITESPACE = re.compile(r"[ \t\n\r]*")
+    _NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+    
+    def __init__(self, f: TextIO, chunk_size: int):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+    
+    def _fill(self) -> bool:
+        """Read more text into the buffer, dropping what was already consumed"""
+        if self._eof:
+            return False
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        # Grow geometrically so a single huge value is not re-parsed per chunk
+        chunk = self._file.read(max(self._chunk_size, len(self._buf)))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+    
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self._buf, self._pos)
+    
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            self._pos = self._WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+    
+    def expect(self, char: str) -> None:
+        """Consume `char` or raise a decode error"""
+        if self.peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self._pos += 1
+    
+    def read_value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number cut off at the buffer edge (e.g. "12." or "1e") decodes
+            # as a shorter number, so read on while only number characters follow
+            if self._NUMBER_TAIL.match(self._buf, end).end() == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+    
+    def iter_object_keys(self) -> Iterator[str]:
+        """Yield the keys of an object; the caller must consume each value"""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self._error("Expecting property name enclosed in double quotes")
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise self._error("Expecting ',' delimiter")
+    
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the items of an array one at a time"""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.read_value()
+            char = self.peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise self._error("Expecting ',' delimiter")
+
+class StreamingAgentFile:
+    """Incrementally parsed view of a .af file
+    
+    All top-level keys except `messages` are parsed eagerly into `header`.
+    The `messages` array is only counted on open and is decoded one message
+    at a time by `iter_messages`, so memory does not grow with history length.
+    """
+    
+    def __init__(self, input_file: str, chunk_size: int = 64 * 1024):
+        """Scan the file once, keeping the header and the message count"""
+        self.input_file = input_file
+        self.chunk_size = chunk_size
+        self.header: Dict[str, Any] = {}
+        self.message_count = 0
+        
+        with _open_agent_text(self.input_file) as f:
+            stream = _JsonStream(f, self.chunk_size)
+            for key in stream.iter_object_keys():
+                if key == "messages":
+                    self.message_count = sum(1 for _ in stream.iter_array())
+                else:
+                    self.header[key] = stream.read_value()
+    
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """Lazily yield the messages, re-reading the file on each call"""
+        with _open_agent_text(self.input_file) as f:
+            stream = _JsonStream(f, self.chunk_size)
+            for key in stream.iter_object_keys():
+                if key == "messages":
+                    yield from stream.iter_array()
+                    return
+                stream.read_value()
+    
+    def get_messages(self, indices: List[int]) -> List[Dict[str, Any]]:
+        """Return the messages at `indices` (in that order) in a single pass"""
+        wanted = {idx for idx in indices if 0 <= idx < self.message_count}
+        found = {}
+        if wanted:
+            for idx, msg in enumerate(self.iter_messages()):
+                if idx in wanted:
+                    found[idx] = msg
+                    if len(found) == len(wanted):
+                        break
+        return [found[idx] for idx in indices if idx in found]
+
+def estimate_tokens(text: str) -> int:
+    """Default token counter: roughly one token per 4 characters"""
+    return (len(text) + 3) // 4
+
+class NormalizedAgent:
+    """Format-neutral view of an agent file shared by all target emitters
+    
+    Built by `AgentFileConverter.normalize` in a single walk over the
+    messages: the system prompt fallback, the in-context messages used for
+    the context summary and the user/assistant history are all collected
+    in that one pass, with each tool message's result attached to the
+    history entry whose call it answers. Tools are mapped to "name",
+    "description", "parameters" (a JSON schema) and "code" whatever the
+    schema version.
+    """
+    
+    def __init__(self, name: str, system_prompt: str, memory_blocks: List[Dict[str, Any]],
+                 tools: List[Dict[str, Any]], model_config: Dict[str, Any],
+                 history: Optional[List[Dict[str, Any]]], context_messages: Optional[List[Dict[str, str]]],
+                 context_window: Optional[int] = None):
+        self.name = name
+        self.system_prompt = system_prompt
+        self.memory_blocks = memory_blocks
+        self.tools = tools
+        self.model_config = model_config
+        # Entries have "role", "content", "tool_calls", "tool_returns" and the
+        # "index" of their message.
+        # None when history was not requested and therefore never built.
+        self.history = history
+        # None when no context summary was requested
+        self.context_messages = context_messages
+        # Token window of the agent's model, if the file declares one
+        self.context_window = context_window
 
 class AgentFileConverter:
     """Base class for converting Agent Files to other formats"""
     
-    def __init__(self, input_file: str):
-        """Initialize the converter with an input .af file"""
+    # Name of the target format and key of the converted message history
+    # in the output's "config"
+    output_format = ""
+    history_key = "history"
+    
+    # When writing history as it is converted, an assistant message whose tool
+    # calls have no result yet is held back until this many entries wait
+    # behind it; then it is written without the missing results
+    stream_pending_limit = 1000
+    
+    def __init__(self, input_file: str, streaming: bool = False,
+                 json_backend: Optional[Union[str, JsonBackend]] = None,
+                 use_mmap: Optional[bool] = None, summary_budget: Optional[int] = None,
+                 token_counter: Optional[Callable[[str], int]] = None,
+                 tool_registry: Optional[ToolRegistry] = None,
+                 stats: Optional[ConversionStats] = None):
+        """Initialize the converter with an input .af file
+        
+        With `streaming=True` only the top-level keys are kept in memory and
+        messages are read lazily from disk whenever they are needed.
+        `json_backend` selects the serializer (see `get_json_backend`) and
+        `use_mmap` controls memory-mapped reading (see `read_agent_data`).
+        `summary_budget` caps the context summary in tokens as counted by
+        `token_counter` (default: `estimate_tokens`). With `tool_registry`,
+        tools are interned in and converted through it, so conversions sharing
+        it convert each distinct tool once; otherwise tools are converted
+        directly and results never share tool objects.
+        Each stage of the conversion is recorded in `stats` when given.
+        """
         self.input_file = input_file
-        self.agent_data = self._load_agent_file()
+        self.streaming = streaming
+        self.json_backend = get_json_backend(json_backend)
+        self.use_mmap = use_mmap
+        self.summary_budget = summary_budget
+        self.token_counter = token_counter or estimate_tokens
+        self.tool_registry = tool_registry
+        self.stats = stats
+        self._stream: Optional[StreamingAgentFile] = None
+        self._normalized: Dict[Tuple[bool, bool, int], NormalizedAgent] = {}
+        # Parsed message dicts, decoded into typed messages as they are read;
+        # empty when streaming, where they are read lazily from disk
+        self.messages: List[Dict[str, Any]] = []
+        with self._stage("load") as stage:
+            self.agent_data = self._load_agent_file()
+            if stage is not None:
+                stage.bytes_read += os.path.getsize(input_file)
+                stage.messages += self.message_count
+    
+    @classmethod
+    def from_converter(cls, other: "AgentFileConverter") -> "AgentFileConverter":
+        """Create a converter that reuses the file already loaded by `other`
+        
+        This lets several target formats be emitted from one load and one
+        normalization pass.
+        """
+        converter = cls.__new__(cls)
+        converter.__dict__.update(other.__dict__)
+        return converter
+    
+    def _stage(self, name: str, messages: int = 0, bytes_read: int = 0):
+        """Context manager recording stage `name` in `stats`, yielding its totals (or None)"""
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.stage(name, messages, bytes_read)
     
     def _load_agent_file(self) -> Dict[str, Any]:
         """Load and parse the .af file"""
         try:
-            with open(self.input_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            print(f"Error: {self.input_file} is not a valid JSON file")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"Error: {self.input_file} not found")
-            sys.exit(1)
+            # The streaming parser is built on the stdlib decoder
+            if self.streaming:
+                self._stream = StreamingAgentFile(self.input_file)
+                return self._stream.header
+            agent_data = read_agent_data(self.input_file, self.json_backend, self.use_mmap)
+            # Typed messages are only built while messages are walked, so
+            # loading costs no second pass and no second copy of the history
+            self.messages = agent_data.pop("messages", None) or []
+            return agent_data
+        except (json.JSONDecodeError, UnicodeDecodeError) + self.json_backend.decode_errors as e:
+            raise AgentFileError(f"{self.input_file} is not a valid JSON file") from e
+        except FileNotFoundError as e:
+            raise AgentFileError(f"{self.input_file} not found") from e
+        except _decompression_errors() as e:
+            raise AgentFileError(f"{self.input_file} is not a valid compressed file") from e
     
-    def convert(self) -> Dict[str, Any]:
-        """Convert the .af file to the target format (abstract method)"""
+    def convert(self, include_history: bool = True, include_context_summary: bool = True) -> Dict[str, Any]:
+        """Convert the .af file to the target format
+        
+        Parts that are switched off are never computed rather than built and
+        then discarded, and their keys are left out of the result.
+        """
+        return self.emit(self.normalize(include_history, include_context_summary))
+    
+    def emit(self, agent: NormalizedAgent) -> Dict[str, Any]:
+        """Build the target format from a normalized agent (abstract method)"""
         raise NotImplementedError("Subclasses must implement this method")
     
-    def save(self, output_file: str, data: Dict[str, Any]) -> None:
-        """Save the converted data to a file"""
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-        print(f"Converted file saved to: {output_file}")
-    
-    def _extract_message_history(self) -> List[Dict[str, Any]]:
-        """Extract message history from the .af file"""
-        messages = self.agent_data.get("messages", [])
-        # Filter out system messages if needed
-        return [msg for msg in messages if msg.get("role") != "system"]
-    
-    def _get_message_content(self, message: Dict[str, Any]) -> str:
-        """Extract text content from a message"""
-        content = message.get("content", [])
-        if not content:
-            return ""
+    def _emit_context(self, agent: NormalizedAgent, config: Dict[str, Any]) -> None:
+        """Add the context summary and message history that were asked for to `config`"""
+        if agent.context_messages is not None:
+            with self._stage("context_summary", messages=len(agent.context_messages)):
+                config["context_summary"] = self._create_context_summary(
+                    agent.context_messages, self._summary_budget(agent, config))
+        if agent.history is not None:
+            with self._stage("message_history", messages=len(agent.history)):
+                config[self.history_key] = self._convert_message_history(agent.history)
+    
+    def _convert_tools(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert named tools, converting each distinct tool only once per registry"""
+        with self._stage("tools"):
+            if self.tool_registry is None:
+                return [self._convert_tool(tool) for tool in tools if tool["name"]]
+            return [self.tool_registry.convert(self.output_format, tool, self._convert_tool)
+                    for tool in tools if tool["name"]]
+    
+    def _convert_tool(self, tool: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert one normalized tool to the target format (abstract method)"""
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def convert_history(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert normalized history entries, such as part of `normalize(...).history`"""
+        return self._convert_message_history(history)
+    
+    def _convert_message_history(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert normalized message history to the target format (abstract method)"""
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def save(self, output_file: str, data: Dict[str, Any], verbose: bool = True, compact: bool = False) -> bytes:
+        """Save the converted data to a file and return the serialized output
         
-        # Handle both string content and structured content
-        if isinstance(content, str):
-            return content
-        
-        # Handle array of content parts
-        if isinstance(content, list):
-            text_parts = []
-            for part in content:
-                # Handle text content parts
-                if isinstance(part, dict) and part.get("type") == "text":
-                    text_parts.append(part.get("text", ""))
-                # Handle string content parts directly
-                elif isinstance(part, str):
-                    text_parts.append(part)
+        Output is written without indentation if `compact`, and gzip or zstd
+        compressed when `output_file` ends in .gz or .zst.
+        """
+        history = data.get("config", {}).get(self.history_key)
+        with self._stage("save", messages=len(history) if history else 0) as stage:
+            payload = self.json_backend.dumps(data, compact=compact)
+            write_output(output_file, payload)
+            if stage is not None:
+                stage.bytes_written += os.path.getsize(output_file)
+        if verbose:
+            print(f"Converted file saved to: {output_file}")
+        return payload
+    
+    def save_streaming(self, output_file: str, include_context_summary: bool = True,
+                       compact: bool = False, verbose: bool = True) -> int:
+        """Convert with the full history and write it to `output_file` entry by entry
+        
+        The output is the same as saving `convert()`, but the converted
+        history is never built in memory: the config is written first, then
+        each history entry as soon as it is converted. Combined with
+        `streaming=True`, memory does not grow with history length.
+        Returns the number of history entries written.
+        """
+        data = self.emit(self.normalize(False, include_context_summary))
+        # Serialize everything else around a placeholder for the history
+        placeholder = f"af-history-{uuid.uuid4().hex}"
+        data["config"][self.history_key] = placeholder
+        dumps = self.json_backend.dumps
+        head, tail = dumps(data, compact=compact).split(dumps(placeholder), 1)
+        line = head[head.rfind(b"\n") + 1:]
+        indent = b" " * (len(line) - len(line.lstrip(b" ")))
+        item_separator = b"\n" + indent + b"  "
+        
+        count = 0
+        with self._stage("save") as stage:
+            with open_output_file(output_file) as f:
+                f.write(head + b"[")
+                for message in self.iter_converted_history():
+                    if count:
+                        f.write(b",")
+                    encoded = dumps(message, compact=compact)
+                    if not compact:
+                        # Strings never hold raw newlines, so these are all line breaks
+                        f.write(item_separator)
+                        encoded = encoded.replace(b"\n", item_separator)
+                    f.write(encoded)
+                    count += 1
+                if count and not compact:
+                    f.write(b"\n" + indent)
+                f.write(b"]" + tail)
+            if stage is not None:
+                stage.messages += count
+                stage.bytes_written += os.path.getsize(output_file)
+        if verbose:
+            print(f"Converted file saved to: {output_file}")
+        return count
+    
+    def save_jsonl(self, output_file: str, manifest_file: Optional[str] = None,
+                   include_context_summary: bool = True, verbose: bool = True) -> int:
+        """Write the converted history to `output_file` as JSON Lines
+        
+        Each line is one converted message, written as soon as it is
+        converted. With `manifest_file`, the rest of the converted output
+        (everything but the history) is written there as JSON, together with
+        the history file's name and line count. Returns the number of lines.
+        """
+        dumps = self.json_backend.dumps
+        count = 0
+        with self._stage("save") as stage:
+            with open_output_file(output_file) as f:
+                for message in self.iter_converted_history():
+                    f.write(dumps(message, compact=True) + b"\n")
+                    count += 1
+            if stage is not None:
+                stage.messages += count
+                stage.bytes_written += os.path.getsize(output_file)
+        if verbose:
+            print(f"Converted history saved to: {output_file}")
+        
+        if manifest_file:
+            data = self.emit(self.normalize(False, include_context_summary))
+            data["history"] = {
+                "file": os.path.relpath(output_file, os.path.dirname(os.path.abspath(manifest_file))),
+                "format": "jsonl",
+                "key": self.history_key,
+                "messages": count
+            }
+            self.save(manifest_file, data, verbose=verbose)
+        return count
+    
+    def iter_converted_history(self) -> Iterator[Dict[str, Any]]:
+        """Yield the converted history messages one at a time (see `iter_history`)"""
+        for entry in self.iter_history():
+            yield from self._convert_message_history([entry])
+    
+    def normalize(self, include_history: bool = True, include_context_summary: bool = True,
+                  history_start: int = 0) -> NormalizedAgent:
+        """Return the normalized agent, walking the messages on first use
+        
+        The history only covers messages from index `history_start` on.
+        """
+        key = (include_history, include_context_summary, history_start)
+        if key not in self._normalized:
+            # Streamed messages are read from disk again for the walk
+            bytes_read = os.path.getsize(self.input_file) if self._stream is not None else 0
+            with self._stage("normalize", messages=self.message_count, bytes_read=bytes_read):
+                self._normalized[key] = self._normalize(include_history, include_context_summary, history_start)
+        return self._normalized[key]
+    
+    def reset_normalization(self) -> None:
+        """Forget normalized agents so the next `normalize` walks the messages again
+        
+        Converters made with `from_converter` keep sharing the cache of the
+        converter they came from.
+        """
+        self._normalized = {}
+    
+    def _normalize(self, include_history: bool, include_context_summary: bool,
+                   history_start: int = 0) -> NormalizedAgent:
+        """Walk the messages once and collect everything the emitters need"""
+        resolver = schema_resolver(self.agent_data.get("version"))
+        
+        # Extract system prompt; the messages are only scanned for one when
+        # the file does not declare it
+        system_prompt = resolver.system(self.agent_data, "")
+        need_system_prompt = not system_prompt
+        
+        # Map message index -> positions in in_context_message_indices
+        in_context_indices = []
+        if include_context_summary:
+            in_context_indices = self.agent_data.get("in_context_message_indices", [])
+        in_context_positions: Dict[int, List[int]] = {}
+        for position, idx in enumerate(in_context_indices):
+            in_context_positions.setdefault(idx, []).append(position)
+        context_slots: List[Optional[Dict[str, str]]] = [None] * len(in_context_indices)
+        
+        history = []
+        # Tool calls still waiting for their result: call id -> (history entry, tool name)
+        pending_calls: Dict[str, Tuple[Dict[str, Any], str]] = {}
+        # Skip the walk entirely when nothing is needed from the messages
+        needs_messages = include_history or in_context_positions or need_system_prompt
+        messages: Iterable[Tuple[int, Message]] = enumerate(self.iter_messages()) if needs_messages else ()
+        if needs_messages and not (include_history or need_system_prompt) and self._stream is None:
+            # Only the in-context messages are needed, so only they are decoded
+            messages = [(idx, self.get_message(idx)) for idx in sorted(in_context_positions)
+                        if 0 <= idx < len(self.messages)]
+        for idx, msg in messages:
+            role = msg.role
+            positions = in_context_positions.get(idx)
+            is_history = include_history and idx >= history_start and role in ("user", "assistant")
+            pending = None
+            if include_history and role == "tool":
+                pending = pending_calls.pop(msg.tool_call_id, None)
+            if not (is_history or pending or positions or (need_system_prompt and role == "system")):
+                continue
+            
+            content = msg.text
+            
+            # Fall back to the first system role message as the system prompt
+            if need_system_prompt and role == "system":
+                system_prompt = content
+                need_system_prompt = False
             
-            return "\n".join(text_parts)
+            if positions:
+                for position in positions:
+                    context_slots[position] = {"role": role or "unknown", "content": content}
+            
+            if is_history:
+                entry = self._normalize_message(msg, role, content)
+                entry["index"] = idx
+                for tool_call in entry["tool_calls"]:
+                    pending_calls[tool_call["id"]] = (entry, tool_call["name"])
+                history.append(entry)
+            
+            # Attach a tool message's result to the assistant message that called it
+            if pending:
+                self._attach_tool_return(pending, msg, content)
         
-        # Fallback for unexpected content structure
-        try:
-            return str(content)
-        except:
-            return "Content could not be extracted"
+        # If still empty, provide a default system message
+        if not system_prompt:
+            system_prompt = "You are a helpful AI assistant."
+            print("Warning: No system message found. Using default system message.")
+        
+        context_messages = None
+        if include_context_summary:
+            context_messages = [slot for slot in context_slots if slot is not None]
+        
+        model_config = resolver.llm_config(self.agent_data, {})
+        return NormalizedAgent(
+            name=self.agent_data.get("name", "Converted Agent"),
+            system_prompt=system_prompt,
+            memory_blocks=resolver.memory(self.agent_data, []),
+            tools=[self._normalize_tool(tool, resolver) for tool in self.agent_data.get("tools") or []],
+            model_config=model_config,
+            history=history if include_history else None,
+            context_messages=context_messages,
+            context_window=model_config.get("context_window")
+        )
     
-    def _create_context_summary(self) -> str:
-        """Create a concise summary from in-context messages"""
-        # Get messages marked as in-context
-        in_context_indices = self.agent_data.get("in_context_message_indices", [])
-        messages = self.agent_data.get("messages", [])
+    def iter_history(self, history_start: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield the normalized history entries one at a time
         
-        if not in_context_indices:
-            return "No context available."
+        Entries match `normalize(...).history`, but only assistant messages
+        still waiting for tool results are kept in memory (see
+        `stream_pending_limit`). With `streaming=True` the messages are read
+        lazily as well.
+        """
+        # Tool calls still waiting for their result: call id -> (history entry, tool name)
+        pending_calls: Dict[str, Tuple[Dict[str, Any], str]] = {}
+        waiting: deque = deque()
+        for idx, msg in enumerate(self.iter_messages()):
+            role = msg.role
+            if role == "tool":
+                pending = pending_calls.pop(msg.tool_call_id, None)
+                if pending:
+                    self._attach_tool_return(pending, msg, msg.text)
+            elif idx >= history_start and role in ("user", "assistant"):
+                entry = self._normalize_message(msg, role, msg.text)
+                entry["index"] = idx
+                for tool_call in entry["tool_calls"]:
+                    pending_calls[tool_call["id"]] = (entry, tool_call["name"])
+                waiting.append(entry)
+            
+            # Entries leave in order, once every call of the oldest one is answered
+            while waiting and (len(waiting) > self.stream_pending_limit
+                               or not any(tool_call["id"] in pending_calls
+                                          for tool_call in waiting[0]["tool_calls"])):
+                entry = waiting.popleft()
+                for tool_call in entry["tool_calls"]:
+                    pending_calls.pop(tool_call["id"], None)
+                yield entry
+        yield from waiting
+    
+    def _attach_tool_return(self, pending: Tuple[Dict[str, Any], str], msg: Message, content: str) -> None:
+        """Add a tool message's result to the history entry whose call it answers"""
+        entry, tool_name = pending
+        entry["tool_returns"].append({
+            "tool_call_id": msg.tool_call_id,
+            "name": msg.name or tool_name,
+            "content": content
+        })
+    
+    def _normalize_tool(self, tool: Dict[str, Any], resolver: SchemaResolver) -> Dict[str, Any]:
+        """Map a tool definition onto its name, description, parameters and code
+        
+        With a tool registry, identical tools of any file share one interned
+        (read-only) dict.
+        """
+        normalized = {
+            "name": resolver.tool_name(tool, ""),
+            "description": resolver.tool_description(tool, ""),
+            "parameters": resolver.tool_parameters(tool, {}),
+            "code": resolver.tool_code(tool)
+        }
+        if self.tool_registry is None:
+            return normalized
+        return self.tool_registry.intern(normalized)
+    
+    def _normalize_message(self, msg: Message, role: str, content: str) -> Dict[str, Any]:
+        """Convert a user/assistant message into a format-neutral history entry"""
+        tool_calls = []
+        if role == "assistant":
+            for tool_call in msg.tool_calls:
+                if tool_call.name is not None:
+                    tool_calls.append({
+                        "id": tool_call.id,
+                        "name": tool_call.name,
+                        "arguments": tool_call.arguments
+                    })
+        
+        tool_returns = []
+        for tool_return in msg.tool_returns:
+            tool_returns.append({
+                "tool_call_id": tool_return.get("tool_call_id", ""),
+                "name": tool_return.get("name", "unknown_function"),
+                "content": tool_return.get("content", "")
+            })
+        
+        return {
+            "role": role,
+            "content": content,
+            "tool_calls": tool_calls,
+            "tool_returns": tool_returns
+        }
+    
+    def iter_messages(self) -> Iterator[Message]:
+        """Iterate over the typed messages, from memory or lazily from disk"""
+        messages = self._stream.iter_messages() if self._stream is not None else self.messages
+        return map(Message.from_dict, messages)
+    
+    @property
+    def message_count(self) -> int:
+        """Number of messages in the agent file"""
+        if self._stream is not None:
+            return self._stream.message_count
+        return len(self.messages)
+    
+    def get_message(self, idx: int) -> Optional[Message]:
+        """Return the typed message at `idx`, or None if there is none"""
+        if self._stream is not None:
+            found = self._stream.get_messages([idx])
+            return Message.from_dict(found[0]) if found else None
+        return Message.from_dict(self.messages[idx]) if 0 <= idx < len(self.messages) else None
+    
+    def _summary_budget(self, agent: NormalizedAgent, config: Dict[str, Any]) -> Optional[int]:
+        """Token budget for the context summary, or None if unbounded
         
-        # Extract only the messages that should be in context
-        relevant_messages = []
-        for idx in in_context_indices:
-            if idx < len(messages):
-                relevant_messages.append(messages[idx])
+        The budget is `summary_budget`, further capped so that the summary
+        plus the system message, memory and tools emitted so far fit into the
+        model's context window.
+        """
+        budget = self.summary_budget
+        if agent.context_window:
+            count = self.token_counter
+            used = count(config.get("system_message", ""))
+            used += sum(count(value) for value in config.get("memory", {}).values())
+            used += sum(count(json.dumps(tool, separators=(",", ":"))) for tool in config.get("tools", []))
+            remaining = max(agent.context_window - used, 0)
+            budget = remaining if budget is None else min(budget, remaining)
+        return budget
+    
+    def _create_context_summary(self, context_messages: List[Dict[str, str]],
+                                budget: Optional[int] = None) -> str:
+        """Create a concise summary from in-context messages
         
-        if not relevant_messages:
+        With a token `budget`, the most recent in-context messages are kept
+        until the budget is spent; the message that crosses it is truncated
+        to fit and older ones are dropped.
+        """
+        if not context_messages:
             return "No context available."
         
         # Format them into a concise summary
-        summary = "Context summary:\n"
-        for msg in relevant_messages:
-            role = msg.get("role", "unknown")
+        header = "Context summary:\n"
+        lines = []
+        for msg in context_messages:
+            role = msg["role"]
             # Skip system messages in summary
             if role == "system":
                 continue
                 
-            content = self._get_message_content(msg)
+            content = msg["content"]
             # Truncate by words rather than characters
             words = content.split()
             if len(words) > 200:
                 content = " ".join(words[:200]) + "..."
                 
-            summary += f"- {role.capitalize()}: {content}\n"
+            lines.append(f"- {role.capitalize()}: {content}\n")
+        
+        # Without lines there is nothing to fit, so the budget changes nothing
+        if budget is None or not lines:
+            return header + "".join(lines)
+        
+        count = self.token_counter
+        remaining = budget - count(header)
+        selected = []
+        for line in reversed(lines):
+            cost = count(line)
+            if cost > remaining:
+                truncated = self._truncate_summary_line(line, remaining)
+                if truncated:
+                    selected.append(truncated)
+                break
+            selected.append(line)
+            remaining -= cost
         
-        return summary
+        # No line fits: an empty summary is better than overflowing the window
+        if not selected:
+            return ""
+        return header + "".join(reversed(selected))
+    
+    def _truncate_summary_line(self, line: str, budget: int) -> str:
+        """Cut a summary line at a word boundary to fit `budget` tokens, or return "" """
+        prefix, _, content = line.rstrip("\n").partition(": ")
+        words = content.split()
+        count = self.token_counter
+        
+        # Binary search for the largest number of words that still fits
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count(f"{prefix}: {' '.join(words[:middle])}...\n") <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        
+        if low == 0:
+            return ""
+        return f"{prefix}: {' '.join(words[:low])}...\n"
 
 class LangChainConverter(AgentFileConverter):
     """Converts Agent Files to LangChain format"""
     
-    def convert(self) -> Dict[str, Any]:
+    output_format = "langchain"
+    history_key = "message_history"
+    
+    def emit(self, agent: NormalizedAgent) -> Dict[str, Any]:
         """Convert to LangChain format"""
-        # Extract system prompt
-        system_prompt = self.agent_data.get("system_prompt", "")
-        
-        # If system_prompt is missing, try to find it in system_message or from system role message
-        if not system_prompt:
-            system_prompt = self.agent_data.get("system_message", "")
-            
-            # If still not found, look for a system message in the messages array
-            if not system_prompt:
-                messages = self.agent_data.get("messages", [])
-                for msg in messages:
-                    if msg.get("role") == "system":
-                        system_prompt = self._get_message_content(msg)
-                        break
-                        
-            # If still empty, provide a default system message
-            if not system_prompt:
-                system_prompt = "You are a helpful AI assistant."
-                print("Warning: No system message found. Using default system message.")
-        
-        # Extract memory blocks
-        memory_blocks = self.agent_data.get("memory_blocks", [])
-        
-        # Extract tools
-        tools = self.agent_data.get("tools", [])
-        
-        # Extract model configuration
-        model_config = self.agent_data.get("model_config", {})
-        
-        # Extract message history
-        message_history = self._convert_message_history()
-        
-        # Create context summary
-        context_summary = self._create_context_summary()
-        
         # Build LangChain compatible format
         langchain_format = {
             "agent_type": "langchain",
             "config": {
-                "system_message": system_prompt,
-                "memory": self._convert_memory(memory_blocks),
-                "tools": self._convert_tools(tools),
-                "model": self._convert_model_config(model_config),
-                "context_summary": context_summary,
-                "message_history": message_history
+                "system_message": agent.system_prompt,
+                "memory": self._convert_memory(agent.memory_blocks),
+                "tools": self._convert_tools(agent.tools),
+                "model": self._convert_model_config(agent.model_config)
             }
         }
         
+        config = langchain_format["config"]
+        self._emit_context(agent, config)
+        
         return langchain_format
     
     def _convert_memory(self, memory_blocks: List[Dict[str, Any]]) -> Dict[str, str]:
@@ -181,144 +977,94 @@ class LangChainConverter(AgentFileConverter):
                 memory[block["label"]] = block["value"]
         return memory
     
-    def _convert_tools(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Convert tools to LangChain tool format"""
-        langchain_tools = []
-        for tool in tools:
-            if not tool.get("name"):
-                continue
-                
-            langchain_tool = {
-                "name": tool.get("name", ""),
-                "description": tool.get("description", ""),
-                "parameters": tool.get("parameters", tool.get("schema", {}))
-            }
-            
-            # If the tool has code, add it as a function string
-            if tool.get("code"):
-                langchain_tool["function_string"] = tool["code"]
-                
-            langchain_tools.append(langchain_tool)
-            
-        return langchain_tools
+    def _convert_tool(self, tool: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a tool to LangChain tool format"""
+        langchain_tool = {
+            "name": tool["name"],
+            "description": tool["description"],
+            "parameters": tool["parameters"]
+        }
+        
+        # If the tool has code, add it as a function string
+        if tool["code"]:
+            langchain_tool["function_string"] = tool["code"]
+        
+        return langchain_tool
     
     def _convert_model_config(self, model_config: Dict[str, Any]) -> Dict[str, Any]:
         """Convert model configuration to LangChain format"""
         return {
-            "provider": "openai" if "openai" in model_config.get("model", "") else "default",
+            "provider": model_config.get("model_endpoint_type")
+                        or ("openai" if "openai" in model_config.get("model", "") else "default"),
             "model_name": model_config.get("model", "").split("/")[-1],
             "temperature": model_config.get("temperature", 0.7),
             "max_tokens": model_config.get("max_tokens", None)
         }
     
-    def _convert_message_history(self) -> List[Dict[str, Any]]:
-        """Convert message history to LangChain format"""
-        messages = self._extract_message_history()
+    def _convert_message_history(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert normalized message history to LangChain format"""
         langchain_messages = []
         
-        for msg in messages:
-            role = msg.get("role", "")
-            if role not in ["user", "assistant"]:
-                continue
-                
-            content = self._get_message_content(msg)
-            
+        for entry in history:
             # Map roles to LangChain format
-            lc_role = "human" if role == "user" else "ai"
+            lc_role = "human" if entry["role"] == "user" else "ai"
             
             langchain_message = {
                 "type": lc_role,
                 "data": {
-                    "content": content,
+                    "content": entry["content"],
                     "additional_kwargs": {}
                 }
             }
             
             # If tool calls are present in assistant messages, add them
-            if role == "assistant" and msg.get("tool_calls"):
-                tool_calls = []
-                for tool_call in msg.get("tool_calls", []):
-                    if tool_call.get("function"):
-                        tool_calls.append({
-                            "name": tool_call["function"].get("name", ""),
-                            "arguments": json.loads(tool_call["function"].get("arguments", "{}"))
-                        })
-                
-                if tool_calls:
-                    langchain_message["data"]["additional_kwargs"]["tool_calls"] = tool_calls
-            
-            # Add tool returns if present
-            if msg.get("tool_returns"):
-                tool_returns = []
-                for tool_return in msg.get("tool_returns", []):
-                    tool_returns.append({
-                        "tool_call_id": tool_return.get("tool_call_id", ""),
-                        "content": tool_return.get("content", "")
-                    })
-                
-                if tool_returns:
-                    langchain_message["data"]["additional_kwargs"]["tool_returns"] = tool_returns
+            if entry["tool_calls"]:
+                langchain_message["data"]["additional_kwargs"]["tool_calls"] = [{
+                    "id": tool_call["id"],
+                    "name": tool_call["name"],
+                    "arguments": json.loads(tool_call["arguments"])
+                } for tool_call in entry["tool_calls"]]
             
             langchain_messages.append(langchain_message)
+            
+            # Tool results follow the message that made the calls
+            for tool_return in entry["tool_returns"]:
+                langchain_messages.append({
+                    "type": "tool",
+                    "data": {
+                        "content": tool_return["content"],
+                        "tool_call_id": tool_return["tool_call_id"],
+                        "name": tool_return["name"]
+                    }
+                })
         
         return langchain_messages
 
 class AutoGenConverter(AgentFileConverter):
     """Converts Agent Files to AutoGen format"""
     
-    def convert(self) -> Dict[str, Any]:
+    output_format = "autogen"
+    history_key = "chat_history"
+    
+    def emit(self, agent: NormalizedAgent) -> Dict[str, Any]:
         """Convert to AutoGen format"""
-        # Extract system prompt
-        system_prompt = self.agent_data.get("system_prompt", "")
-        
-        # If system_prompt is missing, try to find it in system_message or from system role message
-        if not system_prompt:
-            system_prompt = self.agent_data.get("system_message", "")
-            
-            # If still not found, look for a system message in the messages array
-            if not system_prompt:
-                messages = self.agent_data.get("messages", [])
-                for msg in messages:
-                    if msg.get("role") == "system":
-                        system_prompt = self._get_message_content(msg)
-                        break
-                        
-            # If still empty, provide a default system message
-            if not system_prompt:
-                system_prompt = "You are a helpful AI assistant."
-                print("Warning: No system message found. Using default system message.")
-        
-        # Extract memory blocks
-        memory_blocks = self.agent_data.get("memory_blocks", [])
-        
-        # Extract tools
-        tools = self.agent_data.get("tools", [])
-        
-        # Extract model configuration
-        model_config = self.agent_data.get("model_config", {})
-        
-        # Extract message history
-        message_history = self._convert_message_history()
-        
-        # Create context summary
-        context_summary = self._create_context_summary()
-        
         # Build AutoGen compatible format
         autogen_format = {
             "agent_type": "autogen",
             "config": {
-                "name": self.agent_data.get("name", "Converted Agent"),
-                "system_message": system_prompt,
+                "name": agent.name,
+                "system_message": agent.system_prompt,
                 "human_input_mode": "NEVER",
                 "max_consecutive_auto_reply": 10,
-                "memory": self._convert_memory(memory_blocks),
-                "tools": self._convert_tools(tools),
-                "model": self._convert_model_config(model_config),
-                "context_summary": context_summary,
-                "chat_history": message_history
+                "memory": self._convert_memory(agent.memory_blocks),
+                "tools": self._convert_tools(agent.tools),
+                "model": self._convert_model_config(agent.model_config)
             }
         }
         
+        config = autogen_format["config"]
+        self._emit_context(agent, config)
+        
         return autogen_format
     
     def _convert_memory(self, memory_blocks: List[Dict[str, Any]]) -> Dict[str, str]:
@@ -329,26 +1075,19 @@ class AutoGenConverter(AgentFileConverter):
                 memory[block["label"]] = block["value"]
         return memory
     
-    def _convert_tools(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Convert tools to AutoGen tool format"""
-        autogen_tools = []
-        for tool in tools:
-            if not tool.get("name"):
-                continue
-                
-            autogen_tool = {
-                "name": tool.get("name", ""),
-                "description": tool.get("description", ""),
-                "parameters": tool.get("schema", {}).get("properties", {})
-            }
-            
-            # If the tool has code, add it as a function string
-            if tool.get("code"):
-                autogen_tool["implementation"] = tool["code"]
-                
-            autogen_tools.append(autogen_tool)
-            
-        return autogen_tools
+    def _convert_tool(self, tool: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a tool to AutoGen tool format"""
+        autogen_tool = {
+            "name": tool["name"],
+            "description": tool["description"],
+            "parameters": tool["parameters"].get("properties", {})
+        }
+        
+        # If the tool has code, add it as a function string
+        if tool["code"]:
+            autogen_tool["implementation"] = tool["code"]
+        
+        return autogen_tool
     
     def _convert_model_config(self, model_config: Dict[str, Any]) -> Dict[str, Any]:
         """Convert model configuration to AutoGen format"""
@@ -358,106 +1097,511 @@ class AutoGenConverter(AgentFileConverter):
             "max_tokens": model_config.get("max_tokens", None)
         }
     
-    def _convert_message_history(self) -> List[Dict[str, Any]]:
-        """Convert message history to AutoGen format"""
-        messages = self._extract_message_history()
+    def _convert_message_history(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert normalized message history to AutoGen format"""
         autogen_messages = []
         
-        for msg in messages:
-            role = msg.get("role", "")
-            if role not in ["user", "assistant"]:
-                continue
-                
-            content = self._get_message_content(msg)
-            
+        for entry in history:
             # Map roles to AutoGen format
-            ag_role = "human" if role == "user" else "assistant"
+            ag_role = "human" if entry["role"] == "user" else "assistant"
             
             autogen_message = {
                 "role": ag_role,
-                "content": content
+                "content": entry["content"]
             }
             
             # If tool calls are present in assistant messages, add them
-            if role == "assistant" and msg.get("tool_calls"):
-                function_calls = []
-                for tool_call in msg.get("tool_calls", []):
-                    if tool_call.get("function"):
-                        function_calls.append({
-                            "name": tool_call["function"].get("name", ""),
-                            "arguments": tool_call["function"].get("arguments", "{}")
-                        })
-                
-                if function_calls:
-                    autogen_message["function_call"] = function_calls[0]  # AutoGen typically uses the first function call
+            if entry["tool_calls"]:
+                tool_call = entry["tool_calls"][0]  # AutoGen typically uses the first function call
+                autogen_message["function_call"] = {
+                    "name": tool_call["name"],
+                    "arguments": tool_call["arguments"]
+                }
             
-            # Add tool returns if present
-            if msg.get("tool_returns"):
-                # In AutoGen, function responses are separate messages
-                for tool_return in msg.get("tool_returns", []):
-                    tool_return_msg = {
-                        "role": "function",
-                        "name": tool_return.get("name", "unknown_function"),
-                        "content": tool_return.get("content", "")
-                    }
-                    autogen_messages.append(tool_return_msg)
-                    
             autogen_messages.append(autogen_message)
+            
+            # In AutoGen, function responses are separate messages following the call
+            for tool_return in entry["tool_returns"]:
+                autogen_messages.append({
+                    "role": "function",
+                    "name": tool_return["name"],
+                    "content": tool_return["content"]
+                })
         
         return autogen_messages
 
+CONVERTERS = {
+    "langchain": LangChainConverter,
+    "autogen": AutoGenConverter,
+}
+
+def default_output_path(input_file: str, output_format: str, output_dir: Optional[str] = None,
+                        compression: Optional[str] = None, file_type: str = "json") -> str:
+    """Return the output path used when none is given explicitly"""
+    base_name = input_file
+    for extension in COMPRESSION_EXTENSIONS.values():
+        if base_name.endswith(extension):
+            base_name = base_name[:-len(extension)]
+    base_name = os.path.splitext(base_name)[0]
+    if output_dir:
+        base_name = os.path.join(output_dir, os.path.basename(base_name))
+    extension = COMPRESSION_EXTENSIONS[compression] if compression else ""
+    return f"{base_name}.{output_format}.{file_type}{extension}"
+
+def manifest_path(history_file: str) -> str:
+    """Path of the manifest written next to a JSON Lines history file"""
+    base_name = history_file
+    for extension in COMPRESSION_EXTENSIONS.values():
+        if base_name.endswith(extension):
+            base_name = base_name[:-len(extension)]
+    if base_name.endswith(".jsonl"):
+        base_name = base_name[:-len(".jsonl")]
+    return f"{base_name}.manifest.json"
+
+def parse_output_formats(value: Union[str, List[str]]) -> List[str]:
+    """Parse a comma-separated list of output formats, keeping the given order"""
+    formats = value.split(",") if isinstance(value, str) else list(value)
+    formats = [output_format.strip() for output_format in formats if output_format.strip()]
+    if not formats:
+        raise ValueError("At least one output format is required")
+    for output_format in formats:
+        if output_format not in CONVERTERS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+    return list(dict.fromkeys(formats))
+
+def check_conversion_options(include_history: bool = False, incremental: bool = False,
+                             shared_tools: bool = False, stream_output: bool = False,
+                             jsonl: bool = False, manifest: bool = False) -> None:
+    """Raise ValueError for conversion options that cannot be used together
+    
+    Without history, incremental and streamed output are plain conversions,
+    so they only conflict with other options when history is included.
+    """
+    if shared_tools and incremental and include_history:
+        raise ValueError("Shared tool definitions cannot be used with incremental conversion")
+    if stream_output and (shared_tools or incremental) and include_history:
+        raise ValueError("Streamed output cannot be used with shared tool definitions or incremental conversion")
+    if jsonl and (shared_tools or incremental):
+        raise ValueError("JSON Lines output cannot be used with shared tool definitions or incremental conversion")
+    if manifest and not jsonl:
+        raise ValueError("A manifest can only be written with JSON Lines output")
+
+def convert_file(input_file: str, output_formats: Union[str, List[str]], output_file: Optional[str] = None,
+                 output_dir: Optional[str] = None, include_history: bool = False,
+                 context_summary: bool = True, streaming: bool = False,
+                 json_backend: Optional[str] = None, compact: bool = False,
+                 compression: Optional[str] = None, use_mmap: Optional[bool] = None,
+                 summary_budget: Optional[int] = None, incremental: bool = False,
+                 cache_dir: Optional[str] = None, shared_tools: bool = False,
+                 stream_output: bool = False, jsonl: bool = False, manifest: bool = False,
+                 tool_definitions: Optional[Dict[str, Dict[str, Any]]] = None,
+                 tool_registry: Optional[ToolRegistry] = None,
+                 stats: Optional[ConversionStats] = None, verbose: bool = True) -> List[str]:
+    """Convert a single .af file to one or more formats and save them
+    
+    The file is loaded and normalized once regardless of how many formats
+    are requested. Default output paths get the extension of `compression`
+    ("gzip" or "zstd"), which `save` then uses to compress the output.
+    With `incremental` and `include_history`, only messages appended since
+    the previous run are converted (see af_incremental). With `cache_dir`,
+    outputs are reused from and stored in a ConversionCache there, and the
+    file is not even loaded when every format is cached.
+    With `shared_tools`, outputs reference tool definitions kept in a
+    `tools.<format>.json` file next to them instead of embedding them. The
+    definitions are merged into that file, or collected into
+    `tool_definitions` (shared file path -> digest -> tool) when it is given.
+    Tools are interned in `tool_registry` when given, to share them with
+    other conversions; shared tool definitions always use a registry.
+    With `stream_output` and `include_history`, the history is written entry
+    by entry as it is converted (see `save_streaming`) and not cached.
+    With `jsonl`, only the history is written, one message per line (see
+    `save_jsonl`), plus a `.manifest.json` with the rest if `manifest`.
+    Each stage is recorded in `stats` when given, cache hits as "cache".
+    Returns the output paths in the order of `output_formats`.
+    """
+    output_formats = parse_output_formats(output_formats)
+    if output_file and len(output_formats) > 1:
+        raise ValueError("An explicit output file can only be used with a single output format")
+    check_conversion_options(include_history, incremental, shared_tools, stream_output, jsonl, manifest)
+    
+    # Without history there is nothing to append or stream, so a full conversion is as cheap
+    incremental = incremental and include_history
+    stream_output = stream_output and include_history
+    # JSON Lines output is the history itself, written as it is converted
+    stream_output = stream_output or jsonl
+    
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    output_files = [output_file or default_output_path(input_file, output_format, output_dir, compression,
+                                                       "jsonl" if jsonl else "json")
+                    for output_format in output_formats]
+    
+    # Copy cached outputs and remember the keys of the formats still to convert
+    pending = dict.fromkeys(output_formats)
+    cache = ConversionCache(cache_dir) if cache_dir and not (incremental or shared_tools or stream_output) else None
+    if cache is not None:
+        try:
+            input_hash = hash_file(input_file)
+        except FileNotFoundError as e:
+            raise AgentFileError(f"{input_file} not found") from e
+        # Backends serialize differently (e.g. escaping of non-ASCII text), so each has its own entries
+        json_backend = get_json_backend(json_backend)
+        options = {
+            "include_history": include_history,
+            "context_summary": context_summary,
+            "summary_budget": summary_budget,
+            "compact": compact,
+            "json_backend": json_backend.name
+        }
+        for output_format, path in zip(output_formats, output_files):
+            key = cache.key(input_hash, output_format, options, CONVERTER_VERSION)
+            stage = stats.stage("cache") if stats is not None else nullcontext()
+            with stage as record:
+                payload = cache.get(key)
+                if payload is not None:
+                    write_output(path, payload)
+                    if record is not None:
+                        record.bytes_read += len(payload)
+                        record.bytes_written += os.path.getsize(path)
+            if payload is None:
+                pending[output_format] = key
+                continue
+            del pending[output_format]
+            if verbose:
+                print(f"Converted file saved to: {path} (cached)")
+    if not pending:
+        return output_files
+    
+    # References to shared definitions are looked up by the registry's digests
+    if shared_tools and tool_registry is None:
+        tool_registry = ToolRegistry()
+    loader = CONVERTERS[next(iter(pending))](input_file, streaming=streaming, json_backend=json_backend,
+                                             use_mmap=use_mmap, summary_budget=summary_budget,
+                                             tool_registry=tool_registry, stats=stats)
+    if incremental:
+        try:
+            from .af_incremental import convert_incremental
+        except ImportError:
+            from af_incremental import convert_incremental
+    elif not stream_output:
+        agent = loader.normalize(include_history, context_summary)
+    
+    collected = tool_definitions if tool_definitions is not None else {}
+    for output_format, path in zip(output_formats, output_files):
+        if output_format not in pending:
+            continue
+        converter = CONVERTERS[output_format].from_converter(loader)
+        if incremental:
+            convert_incremental(converter, path, context_summary, compact=compact, verbose=verbose)
+            continue
+        if jsonl:
+            converter.save_jsonl(path, manifest_path(path) if manifest else None, context_summary, verbose=verbose)
+            continue
+        if stream_output:
+            converter.save_streaming(path, context_summary, compact=compact, verbose=verbose)
+            continue
+        converted_data = converter.emit(agent)
+        if shared_tools:
+            shared_file = os.path.join(os.path.dirname(path), shared_tools_file(output_format))
+            config = converted_data["config"]
+            config["tools"], definitions = share_tools(config["tools"], converter.tool_registry,
+                                                       os.path.basename(shared_file))
+            collected.setdefault(shared_file, {}).update(definitions)
+        payload = converter.save(path, converted_data, verbose=verbose, compact=compact)
+        if cache is not None and not cache.put(pending[output_format], payload) and verbose:
+            print(f"Warning: Could not write to the conversion cache in {cache.directory}")
+    
+    if tool_definitions is None:
+        for shared_file, definitions in collected.items():
+            save_shared_tools(shared_file, definitions, loader.json_backend, compact=compact)
+    
+    return output_files
+
+def save_shared_tools(path: str, definitions: Dict[str, Dict[str, Any]],
+                      json_backend: Optional[Union[str, JsonBackend]] = None, compact: bool = False) -> None:
+    """Merge tool definitions (digest -> tool) into the shared tools file at `path`"""
+    backend = get_json_backend(json_backend)
+    merged = {}
+    if os.path.exists(path):
+        merged = read_agent_data(path, backend)
+    merged.update(definitions)
+    # Replace the file in one step so readers never see it half written
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write_output(tmp_path, backend.dumps(merged, compact=compact))
+    os.replace(tmp_path, path)
+
+# Tool registry of a batch worker process, shared by the files it converts
+_worker_registry: Optional[ToolRegistry] = None
+
+def _init_batch_worker() -> None:
+    """Give a new batch worker process its tool registry"""
+    global _worker_registry
+    _worker_registry = ToolRegistry()
+
+def _convert_batch_item(job: Dict[str, Any], tool_registry: Optional[ToolRegistry] = None) -> Dict[str, Any]:
+    """Convert one file of a batch, reporting failures instead of raising"""
+    start = time.perf_counter()
+    result = {"input": job["input_file"], "outputs": [], "error": None, "bytes": 0, "tools": {}}
+    # Statistics are collected per file and sent back to the parent with the result
+    stats_options = job.pop("stats_options", None)
+    stats = None
+    if stats_options is not None:
+        profile_dir = stats_options["profile_dir"]
+        if profile_dir:
+            profile_dir = os.path.join(profile_dir, os.path.basename(job["input_file"]))
+        stats = ConversionStats(stats_options["trace_memory"], profile_dir)
+    try:
+        result["bytes"] = os.path.getsize(job["input_file"])
+        # Shared tool definitions go back to the parent, which writes each file once
+        result["outputs"] = convert_file(verbose=False, tool_definitions=result["tools"],
+                                         tool_registry=tool_registry or _worker_registry, stats=stats, **job)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    if stats is not None:
+        result["stats"] = stats.as_dict()
+    return result
+
+def convert_batch(input_files: List[str], output_formats: Union[str, List[str]], output_dir: Optional[str] = None,
+                  workers: Optional[int] = None, stats: Optional[ConversionStats] = None,
+                  input_dir: Optional[str] = None, **options: Any) -> Dict[str, Any]:
+    """Convert many .af files over a process pool
+    
+    Each file is converted independently, so one bad file is reported in the
+    returned summary rather than aborting the batch. `options` are passed
+    through to `convert_file`; with `shared_tools` the tool definitions of
+    all workers are merged here and each shared file is written once.
+    With `stats`, each file's stages are recorded in its result and added to
+    `stats`; cProfile dumps go to one subdirectory per input file.
+    Tools are interned in one registry per worker for the batch only.
+    With `input_dir`, outputs keep their path relative to it under
+    `output_dir`. Files whose outputs would still share a path are reported
+    as failed instead of overwriting each other.
+    """
+    output_formats = parse_output_formats(output_formats)
+    stats_options = None
+    if stats is not None:
+        stats_options = {"trace_memory": stats.trace_memory, "profile_dir": stats.profile_dir}
+    jobs = []
+    for input_file in input_files:
+        job_output_dir = output_dir
+        if output_dir and input_dir:
+            job_output_dir = os.path.normpath(os.path.join(
+                output_dir, os.path.relpath(os.path.dirname(os.path.abspath(input_file)), os.path.abspath(input_dir))))
+        jobs.append({
+            "input_file": input_file,
+            "output_formats": output_formats,
+            "output_dir": job_output_dir,
+            "stats_options": stats_options,
+            **options
+        })
+    
+    # Two inputs with the same name would be written to one output path by different workers
+    file_type = "jsonl" if options.get("jsonl") else "json"
+    owners: Dict[str, str] = {}
+    collisions: Dict[str, str] = {}
+    for job in jobs:
+        for output_format in output_formats:
+            path = os.path.abspath(default_output_path(job["input_file"], output_format, job["output_dir"],
+                                                       options.get("compression"), file_type))
+            owner = owners.setdefault(path, job["input_file"])
+            if owner != job["input_file"]:
+                collisions[owner] = collisions[job["input_file"]] = path
+    colliding = [{"input": job["input_file"], "outputs": [], "bytes": 0, "tools": {}, "seconds": 0.0,
+                  "error": f"Output path {collisions[job['input_file']]} is shared with another input file"}
+                 for job in jobs if job["input_file"] in collisions]
+    jobs = [job for job in jobs if job["input_file"] not in collisions]
+    
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if not jobs:
+        results = []
+    elif workers == 1 or len(jobs) <= 1:
+        tool_registry = ToolRegistry()
+        results = [_convert_batch_item(job, tool_registry) for job in jobs]
+    else:
+        # Hand out several files per task so small files don't drown in IPC
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as executor:
+            results = list(executor.map(_convert_batch_item, jobs, chunksize=chunksize))
+    results.extend(colliding)
+    
+    shared: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        if stats is not None and "stats" in result:
+            stats.merge(result["stats"])
+        for shared_file, definitions in result.pop("tools").items():
+            shared.setdefault(shared_file, {}).update(definitions)
+    for shared_file, definitions in shared.items():
+        save_shared_tools(shared_file, definitions, options.get("json_backend"),
+                          compact=options.get("compact", False))
+    elapsed = time.perf_counter() - start
+    
+    failures = [result for result in results if result["error"]]
+    total_bytes = sum(result["bytes"] for result in results)
+    return {
+        "files": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "failures": failures,
+        "seconds": elapsed,
+        "files_per_second": len(results) / elapsed if elapsed else 0.0,
+        "bytes_per_second": total_bytes / elapsed if elapsed else 0.0,
+        "results": results
+    }
+
+def _print_batch_summary(summary: Dict[str, Any]) -> None:
+    """Print throughput and failures of a batch conversion"""
+    print(f"Converted {summary['succeeded']}/{summary['files']} files in {summary['seconds']:.2f}s "
+          f"({summary['files_per_second']:.1f} files/s, "
+          f"{summary['bytes_per_second'] / (1024 * 1024):.2f} MB/s)")
+    if summary["failures"]:
+        print(f"{summary['failed']} file(s) failed:")
+        for failure in summary["failures"]:
+            print(f"  {failure['input']}: {failure['error']}")
+
+def _output_formats_arg(value: str) -> List[str]:
+    """argparse type for --output-format"""
+    try:
+        return parse_output_formats(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
 def main():
     parser = argparse.ArgumentParser(description="Convert Agent Files (.af) to other frameworks")
-    parser.add_argument("--input", required=True, help="Input .af file path")
-    parser.add_argument("--output-format", required=True, choices=["langchain", "autogen"], 
-                        help="Target framework format")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Input .af file path")
+    source.add_argument("--input-dir", help="Convert every file in this directory matching --pattern")
+    parser.add_argument("--output-format", required=True, type=_output_formats_arg,
+                        help=f"Target framework format, or several separated by commas ({', '.join(CONVERTERS)})")
     parser.add_argument("--output", help="Output file path (default: input filename with new extension)")
+    parser.add_argument("--output-dir", help="Directory for batch outputs (default: next to each input)")
+    parser.add_argument("--pattern", default="*.af",
+                       help="Glob pattern used with --input-dir, '**' recurses (default: *.af)")
+    parser.add_argument("--workers", type=int, default=None,
+                       help="Worker processes for batch mode (default: number of CPUs)")
     parser.add_argument("--include-history", action="store_true", default=False,
                        help="Include full message history in the conversion (default: False)")
     parser.add_argument("--no-context-summary", action="store_true", default=False,
                        help="Exclude context summary from the conversion (default: False)")
+    parser.add_argument("--summary-budget", type=int, default=None,
+                       help="Maximum tokens for the context summary; it is also kept within the "
+                            "model's context window from llm_config (default: window only)")
+    parser.add_argument("--stream", action="store_true", default=False,
+                       help="Parse the input incrementally and read messages lazily (default: False)")
+    parser.add_argument("--stream-output", action="store_true", default=False,
+                       help="With --include-history, write the history entry by entry as it is converted "
+                            "instead of building it in memory first (default: False)")
+    parser.add_argument("--jsonl", action="store_true", default=False,
+                       help="Write only the message history, one converted message per line (default: False)")
+    parser.add_argument("--manifest", action="store_true", default=False,
+                       help="With --jsonl, also write the rest of the output to <name>.manifest.json "
+                            "(default: False)")
+    parser.add_argument("--incremental", action="store_true", default=False,
+                       help="With --include-history, convert only messages appended since the last run "
+                            "and add them to the existing output (default: False)")
+    parser.add_argument("--mmap", choices=["auto", "on", "off"], default="auto",
+                       help="Memory-map uncompressed inputs for parsing (default: auto, files of 1 MiB or more)")
+    parser.add_argument("--json-backend", default="auto", choices=["auto", *JSON_BACKENDS],
+                       help="JSON library used to read and write files (default: fastest installed)")
+    parser.add_argument("--compact", action="store_true", default=False,
+                       help="Write output without indentation, for machine consumers (default: False)")
+    parser.add_argument("--cache-dir", default=None,
+                       help="Directory of the conversion cache (default: $AF_CACHE_DIR or ~/.cache/af_converter)")
+    parser.add_argument("--no-cache", action="store_true", default=False,
+                       help="Always convert, without reading or writing the conversion cache (default: False)")
+    parser.add_argument("--shared-tools", action="store_true", default=False,
+                       help="Write tool definitions once per output directory to tools.<format>.json and "
+                            "reference them from each output (default: False)")
+    parser.add_argument("--compress", choices=list(COMPRESSION_EXTENSIONS),
+                       help="Compress default output paths (an explicit --output is compressed by its extension)")
+    parser.add_argument("--profile", action="store_true", default=False,
+                       help="Print wall time, peak memory, bytes and messages/sec per conversion stage "
+                            "(default: False)")
+    parser.add_argument("--profile-dir", default=None,
+                       help="Also write a cProfile dump per stage to this directory (<stage>.prof)")
+    parser.add_argument("--stats-json", default=None,
+                       help="Write the per-stage statistics to this JSON file")
     
     args = parser.parse_args()
     
-    # Determine output file if not specified
-    if not args.output:
-        base_name = os.path.splitext(args.input)[0]
-        args.output = f"{base_name}.{args.output_format}.json"
+    try:
+        get_json_backend(args.json_backend)
+    except ImportError as e:
+        parser.error(str(e))
+    try:
+        check_conversion_options(args.include_history, args.incremental, args.shared_tools,
+                                 args.stream_output, args.jsonl, args.manifest)
+    except ValueError as e:
+        parser.error(str(e))
     
-    # Select the appropriate converter based on the target format
-    converter_class = None
-    if args.output_format == "langchain":
-        converter_class = LangChainConverter
-    elif args.output_format == "autogen":
-        converter_class = AutoGenConverter
+    options = {
+        "include_history": args.include_history,
+        "context_summary": not args.no_context_summary,
+        "streaming": args.stream,
+        "json_backend": args.json_backend,
+        "compact": args.compact,
+        "compression": args.compress,
+        "use_mmap": {"auto": None, "on": True, "off": False}[args.mmap],
+        "summary_budget": args.summary_budget,
+        "incremental": args.incremental,
+        "cache_dir": None if args.no_cache else args.cache_dir or default_cache_dir(),
+        "shared_tools": args.shared_tools,
+        "stream_output": args.stream_output,
+        "jsonl": args.jsonl,
+        "manifest": args.manifest
+    }
     
-    if converter_class:
-        converter = converter_class(args.input)
-        converted_data = converter.convert()
-        
-        # Handle message history and context summary based on flags
-        config = converted_data["config"]
-        
-        # Remove message history if not requested
-        if not args.include_history:
-            if args.output_format == "langchain" and "message_history" in config:
-                del config["message_history"]
-            elif args.output_format == "autogen" and "chat_history" in config:
-                del config["chat_history"]
-        
-        # Remove context summary if requested
-        if args.no_context_summary and "context_summary" in config:
-            del config["context_summary"]
+    # Peak memory is only traced when the table is asked for, as tracing slows conversion down
+    stats = None
+    if args.profile or args.profile_dir or args.stats_json:
+        stats = ConversionStats(trace_memory=args.profile, profile_dir=args.profile_dir)
+    
+    def report_stats():
+        if stats is None:
+            return
+        if args.profile:
+            print(stats.format_table())
+        if args.stats_json:
+            stats.write_json(args.stats_json)
+            print(f"Statistics saved to: {args.stats_json}")
+    
+    if args.input_dir:
+        if args.output:
+            parser.error("--output cannot be used with --input-dir, use --output-dir instead")
+        if args.workers is not None and args.workers < 1:
+            parser.error("--workers must be at least 1")
         
-        converter.save(args.output, converted_data)
+        input_files = sorted(glob.glob(os.path.join(args.input_dir, args.pattern), recursive=True))
+        if not input_files:
+            print(f"Error: No files matching {args.pattern} in {args.input_dir}")
+            sys.exit(1)
         
-        # Prepare output message
+        summary = convert_batch(input_files, args.output_format, output_dir=args.output_dir,
+                                workers=args.workers, stats=stats, input_dir=args.input_dir, **options)
+        _print_batch_summary(summary)
+        report_stats()
+        sys.exit(1 if summary["failed"] else 0)
+    
+    if args.output and len(args.output_format) > 1:
+        parser.error("--output can only be used with a single output format, use --output-dir instead")
+    
+    try:
+        convert_file(args.input, args.output_format, args.output, output_dir=args.output_dir,
+                     stats=stats, **options)
+    except (AgentFileError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    # Prepare output message
+    if args.jsonl:
+        manifest_status = " and a manifest" if args.manifest else ""
+        print(f"Conversion completed as JSON Lines message history{manifest_status}")
+    else:
         summary_status = "" if args.no_context_summary else " with context summary"
         history_status = " with" if args.include_history else " without"
         print(f"Conversion completed{summary_status}{history_status} message history")
-    else:
-        print(f"Error: Unsupported output format: {args.output_format}")
-        sys.exit(1)
+    report_stats()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+Incremental conversion of long-lived agents
+
+Agents that are re-exported every few minutes mostly gain messages at the
+end. `convert_incremental` keeps a small sidecar state next to the output
+(`<output>.state.json`) recording how far the last run got, and on the next
+run converts only the messages appended since then, adding them to the
+history of the existing output. The configuration part of the output
+(system message, memory, tools, model, context summary) is cheap and is
+always re-emitted from the current file.
+
+The output is rebuilt from scratch when there is no usable state, when
+any option that affects the output (target format, context summary and
+its budget, compact output, JSON backend) differs from the previous run, or
+when the messages the previous run saw have changed: fewer messages, messages
+with different creation times or roles (as when old messages are replaced
+by a summary), or a different last message.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+try:
+    from .af_converter import AgentFileConverter, AgentFileError, read_agent_data
+    from .af_schema import message_fingerprint
+except ImportError:
+    from af_converter import AgentFileConverter, AgentFileError, read_agent_data
+    from af_schema import message_fingerprint
+
+STATE_SUFFIX = ".state.json"
+STATE_VERSION = 2
+
+# Results of convert_incremental
+UNCHANGED = "unchanged"
+APPENDED = "appended"
+REBUILT = "rebuilt"
+
+# Top-level keys that change on every export without affecting the output
+_VOLATILE_KEYS = ("updated_at",)
+
+def state_path(output_file: str) -> str:
+    """Path of the sidecar state kept for `output_file`"""
+    return output_file + STATE_SUFFIX
+
+def _config_hash(converter: AgentFileConverter) -> str:
+    """Hash of everything in the agent file besides the messages"""
+    static = {key: value for key, value in converter.agent_data.items() if key not in _VOLATILE_KEYS}
+    payload = json.dumps(static, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _output_options(converter: AgentFileConverter, include_context_summary: bool, compact: bool) -> Dict[str, Any]:
+    """Every option that changes the output for the same agent file"""
+    return {
+        "format": type(converter).__name__,
+        "include_context_summary": include_context_summary,
+        "summary_budget": converter.summary_budget,
+        "compact": compact,
+        "json_backend": converter.json_backend.name
+    }
+
+def _prefix_digests(converter: AgentFileConverter, *counts: int) -> List[Optional[str]]:
+    """Digest of the creation times and roles of the first `count` messages, for each count
+    
+    All digests are computed in one pass; None for counts beyond the end.
+    """
+    wanted = set(counts)
+    digest = hashlib.sha256()
+    found = {0: digest.hexdigest()}
+    last = max(counts)
+    if last > 0:
+        for idx, msg in enumerate(converter.iter_messages(), 1):
+            digest.update(f"{msg.created_at}|{msg.role}\n".encode("utf-8"))
+            if idx in wanted:
+                found[idx] = digest.hexdigest()
+            if idx >= last:
+                break
+    return [found.get(count) for count in counts]
+
+def _load_state(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+        return None
+    return state
+
+def _save_state(path: str, state: Dict[str, Any]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def _previous_history(converter: AgentFileConverter, output_file: str, state: Dict[str, Any],
+                      options: Dict[str, Any], prefix_digest: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    """History entries of the existing output that can be kept, or None"""
+    if state.get("options") != options or prefix_digest != state["prefix_digest"]:
+        return None
+    
+    # The last message seen last time may have been completed since
+    if message_fingerprint(converter.get_message(state["message_count"] - 1)) != state["last_message"]:
+        return None
+    
+    try:
+        previous = read_agent_data(output_file, converter.json_backend)
+        history = previous["config"][converter.history_key]
+    except (AgentFileError, OSError, ValueError, KeyError, TypeError) + converter.json_backend.decode_errors:
+        return None
+    if not isinstance(history, list) or len(history) < state["resume_output_length"]:
+        return None
+    return history[:state["resume_output_length"]]
+
+def _first_unanswered(history: List[Dict[str, Any]]) -> int:
+    """Position of the first history entry with a tool call still waiting for its result"""
+    for position, entry in enumerate(history):
+        answered = {tool_return["tool_call_id"] for tool_return in entry["tool_returns"]}
+        if any(tool_call["id"] not in answered for tool_call in entry["tool_calls"]):
+            return position
+    return len(history)
+
+def convert_incremental(converter: AgentFileConverter, output_file: str, include_context_summary: bool = True,
+                        compact: bool = False, verbose: bool = True) -> str:
+    """Convert into `output_file`, converting only messages added since the last run
+    
+    Returns UNCHANGED if the output was already up to date, APPENDED if new
+    messages were added to the existing history, or REBUILT otherwise.
+    """
+    state_file = state_path(output_file)
+    config_hash = _config_hash(converter)
+    options = _output_options(converter, include_context_summary, compact)
+    message_count = converter.message_count
+    
+    state = _load_state(state_file)
+    seen_digest, prefix_digest = _prefix_digests(converter, state["message_count"] if state else 0, message_count)
+    kept = _previous_history(converter, output_file, state, options, seen_digest) if state else None
+    if kept is not None and state["message_count"] == message_count and state["config_hash"] == config_hash:
+        if verbose:
+            print(f"{output_file} is up to date")
+        return UNCHANGED
+    
+    # Messages before the resume point are already converted. It sits at the
+    # first tool call of the last run that had no result yet, so a result
+    # arriving now is still paired with its call.
+    start = state["resume_index"] if kept is not None else 0
+    agent = converter.normalize(True, include_context_summary, history_start=start)
+    data = converter.emit(agent)
+    history = data["config"][converter.history_key]
+    
+    position = _first_unanswered(agent.history)
+    resume_index = agent.history[position]["index"] if position < len(agent.history) else message_count
+    held_back = len(converter.convert_history(agent.history[position:]))
+    
+    if kept is not None:
+        data["config"][converter.history_key] = kept + history
+    converter.save(output_file, data, verbose=verbose, compact=compact)
+    _save_state(state_file, {
+        "version": STATE_VERSION,
+        "options": options,
+        "config_hash": config_hash,
+        "message_count": message_count,
+        "prefix_digest": prefix_digest,
+        "last_message": message_fingerprint(converter.get_message(message_count - 1)),
+        "resume_index": resume_index,
+        "resume_output_length": len(data["config"][converter.history_key]) - held_back
+    })
+    return APPENDED if kept is not None else REBUILT
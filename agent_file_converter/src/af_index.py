@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+SQLite index of agent file messages
+
+Answering questions about an agent's history (its messages by role, in a
+time window, or calling a given tool) otherwise means parsing the whole .af
+file and scanning its messages. `MessageIndex` bulk-loads the messages of
+one or many .af files into SQLite once, indexed by agent name, role,
+creation time, tool call id and tool name, so that later lookups are served
+by the indexes.
+
+Files are re-indexed only when their size or modification time changed.
+
+Usage:
+    python af_index.py build --db messages.sqlite3 agent.af more_agents/
+    python af_index.py query --db messages.sqlite3 --agent memgpt_agent --role user --since 2025-04-01
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .af_converter import JSON_BACKENDS, AgentFileConverter, AgentFileError
+except ImportError:
+    from af_converter import JSON_BACKENDS, AgentFileConverter, AgentFileError
+
+SCHEMA_VERSION = 1
+# Files are loaded in one transaction until this many rows have been inserted
+DEFAULT_BATCH_ROWS = 50_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT,
+    version TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    message_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    agent_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    name TEXT,
+    created_at TEXT,
+    tool_call_id TEXT,
+    content TEXT NOT NULL,
+    PRIMARY KEY (agent_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tool_calls (
+    agent_id INTEGER NOT NULL,
+    message_idx INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    call_id TEXT,
+    tool_name TEXT,
+    arguments TEXT,
+    PRIMARY KEY (agent_id, message_idx, position)
+) WITHOUT ROWID;
+"""
+
+_DROP_SCHEMA = """
+DROP TABLE IF EXISTS tool_calls;
+DROP TABLE IF EXISTS messages;
+DROP TABLE IF EXISTS agents;
+"""
+
+# Created after the first bulk load, which is faster than updating them row by row
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS agents_name ON agents (name);
+CREATE INDEX IF NOT EXISTS messages_role ON messages (role, created_at);
+CREATE INDEX IF NOT EXISTS messages_created_at ON messages (created_at);
+CREATE INDEX IF NOT EXISTS messages_tool_call_id ON messages (tool_call_id) WHERE tool_call_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS tool_calls_tool_name ON tool_calls (tool_name, agent_id);
+CREATE INDEX IF NOT EXISTS tool_calls_call_id ON tool_calls (call_id);
+"""
+
+def find_agent_files(paths: Iterable[str], pattern: str = "*.af") -> List[str]:
+    """Expand directories in `paths` to the files in them matching `pattern` ('**' recurses)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, pattern), recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+class MessageIndex:
+    """Messages and tool calls of many agent files in one SQLite database"""
+    
+    def __init__(self, path: str, json_backend: Optional[str] = None, streaming: bool = False,
+                 batch_rows: int = DEFAULT_BATCH_ROWS):
+        """Open (or create) the index at `path`
+        
+        Agent files are read with `json_backend`, or lazily message by
+        message with `streaming=True`. During a build, files are loaded in
+        one transaction until `batch_rows` rows have been inserted.
+        """
+        self.path = path
+        self.json_backend = json_backend
+        self.streaming = streaming
+        self.batch_rows = batch_rows
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # The index only holds what was read from the agent files, so an
+            # index of another schema version is emptied and filled again by the next build
+            self.connection.executescript(_DROP_SCHEMA)
+        self.connection.executescript(_SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._pending_rows = 0
+    
+    def close(self) -> None:
+        self.connection.close()
+    
+    def __enter__(self) -> "MessageIndex":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+    
+    def build(self, paths: Iterable[str]) -> Dict[str, Any]:
+        """Index the given agent files, skipping those unchanged since they were indexed
+        
+        Files that cannot be read are reported rather than aborting the
+        build. Returns counts of indexed, unchanged and failed files and of
+        the messages loaded.
+        """
+        start = time.perf_counter()
+        # Into an empty index, load first and build the secondary indexes once at the end
+        fresh = self.connection.execute("SELECT 1 FROM agents LIMIT 1").fetchone() is None
+        if not fresh:
+            self.connection.executescript(_INDEXES)
+        
+        summary = {"indexed": 0, "unchanged": 0, "failed": [], "messages": 0}
+        for path in paths:
+            try:
+                count = self.add(path, commit=False)
+            except (AgentFileError, OSError, ValueError) as e:
+                summary["failed"].append({"path": path, "error": f"{type(e).__name__}: {e}"})
+                continue
+            if count is None:
+                summary["unchanged"] += 1
+            else:
+                summary["indexed"] += 1
+                summary["messages"] += count
+        self.connection.commit()
+        self._pending_rows = 0
+        
+        if fresh:
+            self.connection.executescript(_INDEXES)
+        self.connection.execute("ANALYZE")
+        summary["seconds"] = time.perf_counter() - start
+        return summary
+    
+    def add(self, path: str, commit: bool = True) -> Optional[int]:
+        """Index one agent file, replacing its earlier rows
+        
+        Returns the number of messages loaded, or None if the file has not
+        changed since it was last indexed.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.connection.execute("SELECT id, size, mtime_ns FROM agents WHERE path = ?", (path,)).fetchone()
+        if row is not None and (row["size"], row["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            return None
+        
+        converter = AgentFileConverter(path, streaming=self.streaming, json_backend=self.json_backend)
+        
+        # A file that fails halfway leaves no rows behind, while the files
+        # before it in the same transaction are kept
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+        self.connection.execute("SAVEPOINT agent_file")
+        try:
+            self._load(converter, path, stat, row["id"] if row is not None else None)
+        except BaseException:
+            self.connection.execute("ROLLBACK TO agent_file")
+            self.connection.execute("RELEASE agent_file")
+            raise
+        self.connection.execute("RELEASE agent_file")
+        
+        if commit or self._pending_rows >= self.batch_rows:
+            self.connection.commit()
+            self._pending_rows = 0
+        return converter.message_count
+    
+    def _load(self, converter: AgentFileConverter, path: str, stat: os.stat_result,
+              agent_id: Optional[int]) -> None:
+        """Replace the rows of one agent file with its current messages"""
+        if agent_id is not None:
+            self._delete_rows(agent_id)
+        agent_id = self.connection.execute(
+            "INSERT OR REPLACE INTO agents (id, path, name, version, size, mtime_ns, message_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (agent_id, path, converter.agent_data.get("name"), converter.agent_data.get("version"),
+             stat.st_size, stat.st_mtime_ns, converter.message_count)
+        ).lastrowid
+        
+        messages: List[Tuple[Any, ...]] = []
+        tool_calls: List[Tuple[Any, ...]] = []
+        for idx, msg in enumerate(converter.iter_messages()):
+            messages.append((agent_id, idx, msg.role, msg.name, msg.created_at, msg.tool_call_id, msg.text))
+            for position, tool_call in enumerate(msg.tool_calls):
+                tool_calls.append((agent_id, idx, position, tool_call.id, tool_call.name, tool_call.arguments))
+            if len(messages) >= 1000:
+                self._insert(messages, tool_calls)
+                messages, tool_calls = [], []
+        self._insert(messages, tool_calls)
+    
+    def remove(self, path: str) -> bool:
+        """Drop an agent file from the index, returning whether it was indexed"""
+        row = self.connection.execute("SELECT id FROM agents WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return False
+        self._delete_rows(row["id"])
+        self.connection.execute("DELETE FROM agents WHERE id = ?", (row["id"],))
+        self.connection.commit()
+        return True
+    
+    def _delete_rows(self, agent_id: int) -> None:
+        self.connection.execute("DELETE FROM messages WHERE agent_id = ?", (agent_id,))
+        self.connection.execute("DELETE FROM tool_calls WHERE agent_id = ?", (agent_id,))
+    
+    def _insert(self, messages: List[Tuple[Any, ...]], tool_calls: List[Tuple[Any, ...]]) -> None:
+        self.connection.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", messages)
+        self.connection.executemany("INSERT INTO tool_calls VALUES (?, ?, ?, ?, ?, ?)", tool_calls)
+        self._pending_rows += len(messages) + len(tool_calls)
+    
+    def agents(self) -> List[Dict[str, Any]]:
+        """The indexed agent files"""
+        rows = self.connection.execute("SELECT path, name, version, message_count FROM agents ORDER BY name, path")
+        return [dict(row) for row in rows]
+    
+    def query(self, agent: Optional[str] = None, role: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, tool_name: Optional[str] = None, tool_call_id: Optional[str] = None,
+              limit: Optional[int] = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """Return the messages matching all the given filters
+        
+        `since` and `until` are ISO 8601 times compared with `created_at`
+        (`since` inclusive, `until` exclusive). `tool_name` matches the
+        messages calling that tool and the tool messages answering those
+        calls; `tool_call_id` matches a call and its answer likewise.
+        Messages are ordered by creation time, then file and position.
+        """
+        # Tool filters select message keys through the tool call indexes, and
+        # the matching messages are then looked up by key
+        key_queries = []
+        key_params: List[Any] = []
+        if tool_name is not None:
+            key_queries.append(
+                "SELECT agent_id, message_idx FROM tool_calls WHERE tool_name = ? "
+                "UNION SELECT r.agent_id, r.idx FROM tool_calls t JOIN messages r "
+                "ON r.tool_call_id = t.call_id AND r.agent_id = t.agent_id WHERE t.tool_name = ?")
+            key_params.extend([tool_name, tool_name])
+        if tool_call_id is not None:
+            key_queries.append(
+                "SELECT agent_id, message_idx FROM tool_calls WHERE call_id = ? "
+                "UNION SELECT agent_id, idx FROM messages WHERE tool_call_id = ?")
+            key_params.extend([tool_call_id, tool_call_id])
+        
+        conditions = []
+        params: List[Any] = []
+        if agent is not None:
+            conditions.append("m.agent_id IN (SELECT id FROM agents WHERE name = ?)")
+            params.append(agent)
+        if role is not None:
+            conditions.append("m.role = ?")
+            params.append(role)
+        if since is not None:
+            conditions.append("m.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("m.created_at < ?")
+            params.append(until)
+        
+        sql = ("SELECT a.name AS agent, a.path, m.agent_id, m.idx AS \"index\", m.role, m.name, m.created_at, "
+               "m.tool_call_id, m.content FROM ")
+        if key_queries:
+            # CROSS JOIN keeps SQLite from scanning messages in created_at order instead
+            keys = " INTERSECT ".join(f"SELECT * FROM ({query})" for query in key_queries)
+            sql += (f"({keys}) k CROSS JOIN messages m ON m.agent_id = k.agent_id AND m.idx = k.message_idx "
+                    "JOIN agents a ON a.id = m.agent_id")
+        else:
+            sql += "messages m JOIN agents a ON a.id = m.agent_id"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY m.created_at, m.agent_id, m.idx LIMIT ? OFFSET ?"
+        params = key_params + params + [-1 if limit is None else limit, offset]
+        
+        results = [dict(row) for row in self.connection.execute(sql, params)]
+        for result in results:
+            agent_id = result.pop("agent_id")
+            result["tool_calls"] = [dict(row) for row in self.connection.execute(
+                "SELECT call_id AS id, tool_name AS name, arguments FROM tool_calls "
+                "WHERE agent_id = ? AND message_idx = ? ORDER BY position", (agent_id, result["index"]))]
+        return results
+
+def _print_messages(messages: List[Dict[str, Any]], as_json: bool) -> None:
+    """Print query results as JSON Lines or one short line per message"""
+    for msg in messages:
+        if as_json:
+            print(json.dumps(msg, ensure_ascii=False))
+            continue
+        calls = ", ".join(call["name"] or "?" for call in msg["tool_calls"])
+        content = " ".join(msg["content"].split())
+        if len(content) > 100:
+            content = content[:97] + "..."
+        print(f"{msg['created_at'] or '-':<27} {msg['agent'] or '-'}#{msg['index']:<6} {msg['role']:<9} "
+              f"{content}{f' [{calls}]' if calls else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Index agent file messages in SQLite and query them")
+    parser.add_argument("--db", default="af_index.sqlite3", help="Index database path (default: af_index.sqlite3)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    build = commands.add_parser("build", help="Add or refresh agent files in the index")
+    build.add_argument("paths", nargs="+", help=".af files, or directories searched with --pattern")
+    build.add_argument("--pattern", default="*.af", help="Glob pattern used in directories, '**' recurses "
+                                                        "(default: *.af)")
+    build.add_argument("--stream", action="store_true", default=False,
+                       help="Read messages lazily instead of parsing each file at once (default: False)")
+    build.add_argument("--json-backend", default="auto", choices=["auto", *JSON_BACKENDS],
+                       help="JSON library used to read files (default: fastest installed)")
+    
+    query = commands.add_parser("query", help="Print the indexed messages matching the filters")
+    query.add_argument("--agent", help="Agent name")
+    query.add_argument("--role", help="Message role (system, user, assistant, tool)")
+    query.add_argument("--since", help="Messages created at or after this ISO 8601 time")
+    query.add_argument("--until", help="Messages created before this ISO 8601 time")
+    query.add_argument("--tool", help="Messages calling this tool, and their results")
+    query.add_argument("--tool-call-id", help="The message making this tool call, and its result")
+    query.add_argument("--limit", type=int, default=100, help="Maximum number of messages (default: 100)")
+    query.add_argument("--offset", type=int, default=0, help="Number of matching messages to skip (default: 0)")
+    query.add_argument("--json", action="store_true", default=False, help="Print messages as JSON Lines")
+    
+    commands.add_parser("agents", help="List the indexed agent files")
+    
+    args = parser.parse_args()
+    
+    if args.command == "query" and not os.path.exists(args.db):
+        print(f"Error: Index {args.db} not found, create it with the build command")
+        sys.exit(1)
+    
+    if args.command == "build":
+        files = find_agent_files(args.paths, args.pattern)
+        if not files:
+            print("Error: No agent files found")
+            sys.exit(1)
+        with MessageIndex(args.db, json_backend=args.json_backend, streaming=args.stream) as index:
+            summary = index.build(files)
+        print(f"Indexed {summary['indexed']} file(s) with {summary['messages']:,} messages in "
+              f"{summary['seconds']:.2f}s, {summary['unchanged']} unchanged")
+        for failure in summary["failed"]:
+            print(f"  {failure['path']}: {failure['error']}")
+        sys.exit(1 if summary["failed"] else 0)
+    
+    with MessageIndex(args.db) as index:
+        if args.command == "agents":
+            for agent in index.agents():
+                print(f"{agent['name'] or '-':<30} {agent['message_count']:>9,}  {agent['path']}")
+            return
+        messages = index.query(agent=args.agent, role=args.role, since=args.since, until=args.until,
+                               tool_name=args.tool, tool_call_id=args.tool_call_id,
+                               limit=args.limit, offset=args.offset)
+    _print_messages(messages, args.json)
+
+if __name__ == "__main__":
+    main()
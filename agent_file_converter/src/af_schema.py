@@ -0,0 +1,186 @@
+"""
+Typed model of the Agent File (.af) schema
+
+Compact `__slots__` classes for the messages of a Letta export, with their
+content parts and tool calls. Messages are the bulk of an agent file, and
+instances are much smaller than the equivalent parsed dicts and give cheap
+attribute access in the converters' per-message loops.
+
+Only the fields the converters care about are modelled; everything else in
+the message is ignored on decode.
+
+`schema_resolver` maps the converters' logical fields (system prompt, memory,
+model config, tool code and parameters) onto the keys a given schema
+version actually uses, so converters read them directly.
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+class ContentPart:
+    """A single part of a message's content, e.g. {"type": "text", "text": ...}"""
+    
+    __slots__ = ("type", "text")
+    
+    def __init__(self, type: str = "text", text: str = ""):
+        self.type = type
+        self.text = text
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ContentPart":
+        return cls(data.get("type", ""), data.get("text", ""))
+
+class ToolCall:
+    """A tool call requested by an assistant message
+    
+    `name` is None when the call carries no function payload.
+    """
+    
+    __slots__ = ("id", "type", "name", "arguments")
+    
+    def __init__(self, id: str = "", type: str = "function", name: Optional[str] = None,
+                 arguments: Optional[str] = None):
+        self.id = id
+        self.type = type
+        self.name = name
+        self.arguments = arguments
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ToolCall":
+        function = data.get("function")
+        if not function:
+            return cls(data.get("id", ""), data.get("type", "function"))
+        return cls(data.get("id", ""), data.get("type", "function"),
+                   function.get("name", ""), function.get("arguments", "{}"))
+
+class Message:
+    """A message of the agent's history"""
+    
+    __slots__ = ("role", "content", "name", "tool_call_id", "tool_calls", "tool_returns",
+                 "created_at", "model")
+    
+    def __init__(self, role: str = "", content: Union[str, List[Union[ContentPart, str]], None] = None,
+                 name: Optional[str] = None, tool_call_id: Optional[str] = None,
+                 tool_calls: Optional[List[ToolCall]] = None,
+                 tool_returns: Optional[List[Dict[str, Any]]] = None,
+                 created_at: Optional[str] = None, model: Optional[str] = None):
+        self.role = role
+        self.content = content
+        self.name = name
+        self.tool_call_id = tool_call_id
+        self.tool_calls = tool_calls or []
+        self.tool_returns = tool_returns or []
+        self.created_at = created_at
+        self.model = model
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        get = data.get
+        content = get("content")
+        if isinstance(content, list):
+            content = [ContentPart.from_dict(part) if isinstance(part, dict) else part
+                       for part in content]
+        tool_calls = get("tool_calls")
+        # Positional arguments, as this runs once per message on every walk
+        return cls(get("role", ""), content, get("name"), get("tool_call_id"),
+                   [ToolCall.from_dict(call) for call in tool_calls] if tool_calls else None,
+                   get("tool_returns"), get("created_at"), get("model"))
+    
+    @property
+    def text(self) -> str:
+        """Text content of the message, with text parts joined by newlines"""
+        content = self.content
+        if not content:
+            return ""
+        
+        # Handle both string content and structured content
+        if isinstance(content, str):
+            return content
+        
+        # Handle array of content parts
+        if isinstance(content, list):
+            text_parts = []
+            for part in content:
+                # Handle text content parts
+                if isinstance(part, ContentPart):
+                    if part.type == "text":
+                        text_parts.append(part.text)
+                # Handle string content parts directly
+                elif isinstance(part, str):
+                    text_parts.append(part)
+            
+            return "\n".join(text_parts)
+        
+        # Fallback for unexpected content structure
+        try:
+            return str(content)
+        except Exception:
+            return "Content could not be extracted"
+
+def message_fingerprint(msg: Optional[Message]) -> Optional[List[Any]]:
+    """Identify a message by creation time, role and a hash of its text
+    
+    Used to tell whether a file's earlier messages are still in place when
+    it is converted or indexed again.
+    """
+    if msg is None:
+        return None
+    return [msg.created_at, msg.role, hashlib.sha256(msg.text.encode("utf-8")).hexdigest()]
+
+# Key paths for each logical field, tried in order. Pre-Letta converter input
+# has no `version` and uses the legacy keys; versioned Letta exports use the
+# native keys, with the legacy ones kept as fallbacks.
+_LEGACY_FIELDS = {
+    "system": ("system_prompt", "system_message"),
+    "memory": ("memory_blocks",),
+    "llm_config": ("model_config",),
+    "tool_name": ("name",),
+    "tool_description": ("description",),
+    "tool_parameters": ("parameters", "schema"),
+    "tool_code": ("code",)
+}
+_LETTA_FIELDS = {
+    "system": ("system", "system_prompt", "system_message"),
+    "memory": ("core_memory", "memory_blocks"),
+    "llm_config": ("llm_config", "model_config"),
+    "tool_name": ("name", "json_schema.name"),
+    "tool_description": ("description", "json_schema.description"),
+    "tool_parameters": ("json_schema.parameters", "parameters", "schema"),
+    "tool_code": ("source_code", "code")
+}
+
+def _compile_getter(paths: Tuple[str, ...]) -> Callable[..., Any]:
+    """Build a getter returning the first non-empty value among dotted key paths"""
+    key_paths = [tuple(path.split(".")) for path in paths]
+    
+    def get(data: Dict[str, Any], default: Any = None) -> Any:
+        for keys in key_paths:
+            value = data
+            for key in keys:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value:
+                return value
+        return default
+    
+    return get
+
+class SchemaResolver:
+    """Compiled field getters for one schema version
+    
+    Each attribute is a getter taking the agent (or tool) dict and an
+    optional default, e.g. `resolver.system(agent_data, "")`.
+    """
+    
+    __slots__ = ("version", "system", "memory", "llm_config", "tool_name", "tool_description",
+                 "tool_parameters", "tool_code")
+    
+    def __init__(self, version: Optional[str], fields: Dict[str, Tuple[str, ...]]):
+        self.version = version
+        for field, paths in fields.items():
+            setattr(self, field, _compile_getter(paths))
+
+@lru_cache(maxsize=None)
+def schema_resolver(version: Optional[str]) -> SchemaResolver:
+    """Return the field resolver for a schema `version`, compiled once per version"""
+    return SchemaResolver(version, _LETTA_FIELDS if version else _LEGACY_FIELDS)
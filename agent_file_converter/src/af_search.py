@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Offline conversation search over agent file histories
+
+Letta agents search their history with the server-side `conversation_search`
+tool. `SearchIndex` provides the same search offline: a full-text inverted
+index over the message content of one or many .af files, answering ranked
+(BM25) and paged queries without scanning the messages for every query.
+
+The index is built incrementally. Files that have not changed are skipped,
+files that only gained messages at the end have just those messages added,
+and other changed files are re-indexed. It is saved as one compact file:
+document ids in posting lists are delta encoded, and the whole file is
+zlib compressed.
+
+Usage:
+    python af_search.py --index history.afsi build ../memgpt_agent /path/to/exports
+    python af_search.py --index history.afsi search "favourite food" --page 0
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    from .af_converter import JSON_BACKENDS, AgentFileConverter, AgentFileError
+    from .af_index import find_agent_files
+    from .af_schema import message_fingerprint
+except ImportError:
+    from af_converter import JSON_BACKENDS, AgentFileConverter, AgentFileError
+    from af_index import find_agent_files
+    from af_schema import message_fingerprint
+
+FORMAT_MAGIC = b"AFSI"
+FORMAT_VERSION = 1
+DEFAULT_ROLES = ("user", "assistant")
+# Results per page, as in Letta's conversation_search
+DEFAULT_PAGE_SIZE = 5
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of `text`"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _searchable_text(msg) -> str:
+    """Message text plus its tool call arguments, where sent messages live"""
+    parts = [msg.text]
+    parts.extend(tool_call.arguments for tool_call in msg.tool_calls if tool_call.arguments)
+    return "\n".join(part for part in parts if part)
+
+class SearchIndex:
+    """BM25-ranked inverted index over the messages of many agent files"""
+    
+    def __init__(self, roles: Iterable[str] = DEFAULT_ROLES):
+        """Create an empty index of the messages with one of `roles`"""
+        self.roles = tuple(roles)
+        # Indexed files: path -> name, size, mtime_ns, message_count, last_message
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._file_paths: List[str] = []
+        # Per document: file number, message index, token count, role, created_at and text
+        self.doc_file = array("I")
+        self.doc_message = array("I")
+        self.doc_length = array("I")
+        self.doc_role: List[str] = []
+        self.doc_created_at: List[Optional[str]] = []
+        self.doc_text: List[str] = []
+        # Per term: ascending document ids and the term's count in each
+        self.postings: Dict[str, array] = {}
+        self.frequencies: Dict[str, array] = {}
+        # Documents of files that were re-indexed, dropped on the next save
+        self.deleted: set = set()
+        self._live_length = 0
+    
+    @property
+    def document_count(self) -> int:
+        """Number of searchable documents"""
+        return len(self.doc_length) - len(self.deleted)
+    
+    def add_file(self, path: str, json_backend: Optional[str] = None, streaming: bool = False) -> Optional[int]:
+        """Index the messages of one agent file
+        
+        Returns the number of documents added, or None if the file has not
+        changed since it was indexed.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self.files.get(path)
+        if known is not None and (known["size"], known["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            return None
+        
+        converter = AgentFileConverter(path, streaming=streaming, json_backend=json_backend)
+        start = 0
+        if known is not None:
+            # Only the new messages need indexing when the old ones are still in place
+            previous = known["message_count"]
+            if (converter.message_count >= previous and
+                    message_fingerprint(converter.get_message(previous - 1)) == known["last_message"]):
+                start = previous
+            else:
+                self._delete_file(path)
+        if path not in self._file_paths:
+            self._file_paths.append(path)
+        file_number = self._file_paths.index(path)
+        
+        added = 0
+        for idx, msg in enumerate(converter.iter_messages()):
+            if idx < start or msg.role not in self.roles:
+                continue
+            self._add_document(file_number, idx, msg.role, msg.created_at, _searchable_text(msg))
+            added += 1
+        
+        self.files[path] = {
+            "name": converter.agent_data.get("name"),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "message_count": converter.message_count,
+            "last_message": message_fingerprint(converter.get_message(converter.message_count - 1))
+        }
+        return added
+    
+    def build(self, paths: Iterable[str], json_backend: Optional[str] = None,
+              streaming: bool = False) -> Dict[str, Any]:
+        """Add or refresh many agent files, reporting failures instead of raising"""
+        summary = {"indexed": 0, "unchanged": 0, "documents": 0, "failed": []}
+        for path in paths:
+            try:
+                added = self.add_file(path, json_backend, streaming)
+            except (AgentFileError, OSError, ValueError) as e:
+                summary["failed"].append({"path": path, "error": f"{type(e).__name__}: {e}"})
+                continue
+            if added is None:
+                summary["unchanged"] += 1
+            else:
+                summary["indexed"] += 1
+                summary["documents"] += added
+        return summary
+    
+    def _add_document(self, file_number: int, message: int, role: str, created_at: Optional[str],
+                      text: str) -> None:
+        doc = len(self.doc_length)
+        counts: Dict[str, int] = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        for term, count in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array("I")
+                self.frequencies[term] = array("I")
+            postings.append(doc)
+            self.frequencies[term].append(count)
+        
+        length = sum(counts.values())
+        self.doc_file.append(file_number)
+        self.doc_message.append(message)
+        self.doc_length.append(length)
+        self.doc_role.append(role)
+        self.doc_created_at.append(created_at)
+        self.doc_text.append(text)
+        self._live_length += length
+    
+    def _delete_file(self, path: str) -> None:
+        """Mark the documents of a file as deleted"""
+        file_number = self._file_paths.index(path)
+        for doc, number in enumerate(self.doc_file):
+            if number == file_number and doc not in self.deleted:
+                self.deleted.add(doc)
+                self._live_length -= self.doc_length[doc]
+        del self.files[path]
+    
+    def search(self, query: str, page: int = 0, page_size: int = DEFAULT_PAGE_SIZE,
+               agent: Optional[str] = None) -> Dict[str, Any]:
+        """Rank the documents matching any term of `query` by BM25 and return one page
+        
+        Returns the total number of matches, the page and the page's results,
+        best first; ties are broken by message order.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        allowed = None
+        if agent is not None:
+            allowed = {number for number, path in enumerate(self._file_paths)
+                       if self.files.get(path, {}).get("name") == agent}
+        
+        count = self.document_count
+        average_length = self._live_length / count if count else 0.0
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            frequencies = self.frequencies[term]
+            document_frequency = len(postings)
+            if self.deleted:
+                document_frequency -= sum(1 for doc in postings if doc in self.deleted)
+            idf = math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+            doc_length = self.doc_length
+            for doc, frequency in zip(postings, frequencies):
+                if doc in self.deleted or (allowed is not None and self.doc_file[doc] not in allowed):
+                    continue
+                norm = K1 * (1 - B + B * doc_length[doc] / average_length) if average_length else K1
+                scores[doc] = scores.get(doc, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        
+        page = max(page, 0)
+        ranked = heapq.nlargest((page + 1) * page_size, scores.items(), key=lambda item: (item[1], -item[0]))
+        results = []
+        for doc, score in ranked[page * page_size:]:
+            path = self._file_paths[self.doc_file[doc]]
+            results.append({
+                "agent": self.files[path]["name"],
+                "path": path,
+                "index": self.doc_message[doc],
+                "role": self.doc_role[doc],
+                "created_at": self.doc_created_at[doc],
+                "content": self.doc_text[doc],
+                "score": score
+            })
+        return {"query": query, "page": page, "page_size": page_size, "total": len(scores), "results": results}
+    
+    def conversation_search(self, query: str, page: Optional[int] = 0, agent: Optional[str] = None) -> str:
+        """Answer like Letta's conversation_search tool, as text for an agent"""
+        found = self.search(query, page or 0, DEFAULT_PAGE_SIZE, agent)
+        if not found["results"]:
+            return "No results found."
+        pages = math.ceil(found["total"] / DEFAULT_PAGE_SIZE)
+        results = [f"timestamp: {result['created_at']}, {result['role']} - {result['content']}"
+                   for result in found["results"]]
+        return (f"Showing {len(results)} of {found['total']} results (page {found['page']}/{pages - 1}): "
+                f"{json.dumps(results, ensure_ascii=False)}")
+    
+    def _compact(self) -> None:
+        """Drop deleted documents and renumber the rest"""
+        if not self.deleted:
+            return
+        remap = array("I", [0] * len(self.doc_length))
+        kept = [doc for doc in range(len(self.doc_length)) if doc not in self.deleted]
+        for new, doc in enumerate(kept):
+            remap[doc] = new
+        for term in list(self.postings):
+            postings, frequencies = self.postings[term], self.frequencies[term]
+            pairs = [(remap[doc], frequency) for doc, frequency in zip(postings, frequencies)
+                     if doc not in self.deleted]
+            if not pairs:
+                del self.postings[term], self.frequencies[term]
+                continue
+            self.postings[term] = array("I", (doc for doc, _ in pairs))
+            self.frequencies[term] = array("I", (frequency for _, frequency in pairs))
+        self.doc_file = array("I", (self.doc_file[doc] for doc in kept))
+        self.doc_message = array("I", (self.doc_message[doc] for doc in kept))
+        self.doc_length = array("I", (self.doc_length[doc] for doc in kept))
+        self.doc_role = [self.doc_role[doc] for doc in kept]
+        self.doc_created_at = [self.doc_created_at[doc] for doc in kept]
+        self.doc_text = [self.doc_text[doc] for doc in kept]
+        self.deleted = set()
+    
+    def save(self, path: str) -> int:
+        """Write the index to `path` and return its size in bytes"""
+        self._compact()
+        terms = list(self.postings)
+        offsets = array("I", [0])
+        deltas = array("I")
+        frequencies = array("I")
+        for term in terms:
+            previous = 0
+            for doc in self.postings[term]:
+                deltas.append(doc - previous)
+                previous = doc
+            frequencies.extend(self.frequencies[term])
+            offsets.append(len(deltas))
+        
+        header = json.dumps({
+            "roles": self.roles,
+            "files": [dict(self.files[path], path=path) for path in self._file_paths if path in self.files],
+            "file_numbers": [number for number, path in enumerate(self._file_paths) if path in self.files],
+            "terms": terms,
+            "doc_role": self.doc_role,
+            "doc_created_at": self.doc_created_at,
+            "doc_text": self.doc_text
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        
+        arrays = [offsets, deltas, frequencies, self.doc_file, self.doc_message, self.doc_length]
+        body = [struct.pack("<I", len(header)), header]
+        for values in arrays:
+            # Arrays are stored little-endian whatever the platform
+            if sys.byteorder == "big":
+                values = array("I", values)
+                values.byteswap()
+            body.append(struct.pack("<I", len(values)))
+            body.append(values.tobytes())
+        payload = FORMAT_MAGIC + struct.pack("<I", FORMAT_VERSION) + zlib.compress(b"".join(body), 6)
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return len(payload)
+    
+    @classmethod
+    def load(cls, path: str) -> "SearchIndex":
+        """Read an index written by `save`"""
+        with open(path, "rb") as f:
+            payload = f.read()
+        if payload[:4] != FORMAT_MAGIC or struct.unpack_from("<I", payload, 4)[0] != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a search index of version {FORMAT_VERSION}")
+        body = memoryview(zlib.decompress(payload[8:]))
+        
+        (size,) = struct.unpack_from("<I", body, 0)
+        header = json.loads(bytes(body[4:4 + size]))
+        position = 4 + size
+        arrays = []
+        for _ in range(6):
+            (length,) = struct.unpack_from("<I", body, position)
+            position += 4
+            values = array("I")
+            values.frombytes(body[position:position + length * values.itemsize])
+            if sys.byteorder == "big":
+                values.byteswap()
+            arrays.append(values)
+            position += length * values.itemsize
+        offsets, deltas, frequencies, doc_file, doc_message, doc_length = arrays
+        
+        index = cls(header["roles"])
+        # File numbers are kept as saved, so a gap is left where a file was dropped
+        numbers = header["file_numbers"]
+        index._file_paths = [""] * (max(numbers) + 1 if numbers else 0)
+        for number, entry in zip(numbers, header["files"]):
+            entry = dict(entry)
+            file_path = entry.pop("path")
+            index._file_paths[number] = file_path
+            index.files[file_path] = entry
+        for number, term in enumerate(header["terms"]):
+            start, end = offsets[number], offsets[number + 1]
+            postings = array("I")
+            doc = 0
+            for delta in deltas[start:end]:
+                doc += delta
+                postings.append(doc)
+            index.postings[term] = postings
+            index.frequencies[term] = frequencies[start:end]
+        index.doc_file, index.doc_message, index.doc_length = doc_file, doc_message, doc_length
+        index.doc_role = header["doc_role"]
+        index.doc_created_at = header["doc_created_at"]
+        index.doc_text = header["doc_text"]
+        index._live_length = sum(doc_length)
+        return index
+
+def open_index(path: str, roles: Iterable[str] = DEFAULT_ROLES) -> SearchIndex:
+    """Load the index at `path`, or create an empty one if there is none"""
+    if os.path.exists(path):
+        return SearchIndex.load(path)
+    return SearchIndex(roles)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and search an offline index of agent file histories")
+    parser.add_argument("--index", default="af_search.afsi", help="Index file path (default: af_search.afsi)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    build = commands.add_parser("build", help="Add or refresh agent files in the index")
+    build.add_argument("paths", nargs="+", help=".af files, or directories searched with --pattern")
+    build.add_argument("--pattern", default="*.af", help="Glob pattern used in directories, '**' recurses "
+                                                        "(default: *.af)")
+    build.add_argument("--roles", default=",".join(DEFAULT_ROLES),
+                       help="Message roles to index when creating the index (default: user,assistant)")
+    build.add_argument("--stream", action="store_true", default=False,
+                       help="Read messages lazily instead of parsing each file at once (default: False)")
+    build.add_argument("--json-backend", default="auto", choices=["auto", *JSON_BACKENDS],
+                       help="JSON library used to read files (default: fastest installed)")
+    
+    search = commands.add_parser("search", help="Print the best matching messages for a query")
+    search.add_argument("query", help="Words to search for")
+    search.add_argument("--page", type=int, default=0, help="Page of results, from 0 (default: 0)")
+    search.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"Results per page (default: {DEFAULT_PAGE_SIZE})")
+    search.add_argument("--agent", help="Only search the files of this agent")
+    search.add_argument("--json", action="store_true", default=False, help="Print the results as JSON")
+    
+    args = parser.parse_args()
+    
+    if args.command == "build":
+        files = find_agent_files(args.paths, args.pattern)
+        index = open_index(args.index, [role.strip() for role in args.roles.split(",") if role.strip()])
+        summary = index.build(files, args.json_backend, args.stream)
+        size = index.save(args.index)
+        print(f"Indexed {summary['indexed']} file(s), {summary['documents']:,} new messages, "
+              f"{summary['unchanged']} unchanged; {index.document_count:,} messages and "
+              f"{len(index.postings):,} terms in {size / 1024:.1f} KB")
+        for failure in summary["failed"]:
+            print(f"  {failure['path']}: {failure['error']}")
+        sys.exit(1 if summary["failed"] else 0)
+    
+    if not os.path.exists(args.index):
+        print(f"Error: Index {args.index} not found, create it with the build command")
+        sys.exit(1)
+    found = SearchIndex.load(args.index).search(args.query, args.page, args.page_size, args.agent)
+    if args.json:
+        print(json.dumps(found, indent=2, ensure_ascii=False))
+        return
+    print(f"{found['total']} matching messages, page {found['page']}:")
+    for result in found["results"]:
+        content = " ".join(result["content"].split())
+        if len(content) > 100:
+            content = content[:97] + "..."
+        print(f"{result['score']:>7.3f}  {result['created_at'] or '-':<27} {result['agent'] or '-'}#{result['index']:<6} "
+              f"{result['role']:<9} {content}")
+
+if __name__ == "__main__":
+    main()
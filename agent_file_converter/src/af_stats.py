@@ -0,0 +1,134 @@
+"""
+Per-stage conversion statistics
+
+A ConversionStats object handed to a converter records, for each stage of a
+conversion (load, normalize, tools, context_summary, message_history, save),
+how often it ran, its wall time, its peak memory, the bytes it read and
+wrote and the messages it handled. Stages do not nest, so their times add
+up to the time spent converting.
+
+Peak memory is measured with tracemalloc, which slows Python down several
+times, so it is optional. With `profile_dir` each stage is also run under
+cProfile and its profile is written to `<profile_dir>/<stage>.prof`, which
+can be read with `python -m pstats` or snakeviz.
+"""
+
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+class StageStats:
+    """Totals of one stage over all of its runs"""
+    
+    __slots__ = ("calls", "seconds", "peak_bytes", "bytes_read", "bytes_written", "messages")
+    
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes: Optional[int] = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.messages = 0
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "peak_bytes": self.peak_bytes,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "messages": self.messages,
+            "messages_per_second": self.messages / self.seconds if self.seconds else None
+        }
+
+class ConversionStats:
+    """Collects StageStats by stage name"""
+    
+    def __init__(self, trace_memory: bool = False, profile_dir: Optional[str] = None):
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.stages: Dict[str, StageStats] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+    
+    @contextmanager
+    def stage(self, name: str, messages: int = 0, bytes_read: int = 0) -> Iterator[StageStats]:
+        """Time, trace and profile the enclosed block as one run of stage `name`
+        
+        Yields the stage's totals so that counts only known at the end of the
+        block (such as bytes written) can be added to them.
+        """
+        record = self.stages.setdefault(name, StageStats())
+        record.calls += 1
+        record.messages += messages
+        record.bytes_read += bytes_read
+        
+        # Allocations are measured against what is already traced, so the
+        # caller may run tracemalloc around the whole conversion
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        
+        profile = None
+        if self.profile_dir:
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+        
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds += time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                record.peak_bytes = max(record.peak_bytes or 0, peak)
+                if started_tracing:
+                    tracemalloc.stop()
+    
+    def merge(self, stats: Dict[str, Any]) -> None:
+        """Add the stages of another run, given as returned by `as_dict`"""
+        for name, values in stats["stages"].items():
+            record = self.stages.setdefault(name, StageStats())
+            record.calls += values["calls"]
+            record.seconds += values["seconds"]
+            record.bytes_read += values["bytes_read"]
+            record.bytes_written += values["bytes_written"]
+            record.messages += values["messages"]
+            if values["peak_bytes"] is not None:
+                record.peak_bytes = max(record.peak_bytes or 0, values["peak_bytes"])
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "seconds": sum(record.seconds for record in self.stages.values()),
+            "stages": {name: record.as_dict() for name, record in self.stages.items()}
+        }
+    
+    def write_json(self, path: str) -> None:
+        """Write the statistics to `path` as JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2)
+    
+    def format_table(self) -> str:
+        """The statistics as a table, one stage per row"""
+        total = sum(record.seconds for record in self.stages.values())
+        lines = [f"{'stage':<18} {'calls':>6} {'seconds':>10} {'share':>7} {'peak MB':>9} "
+                 f"{'read MB':>9} {'written MB':>11} {'msgs/sec':>12}"]
+        for name, record in self.stages.items():
+            values = record.as_dict()
+            peak = f"{record.peak_bytes / 1048576:.1f}" if record.peak_bytes is not None else "-"
+            rate = f"{values['messages_per_second']:,.0f}" if record.messages and values["messages_per_second"] else "-"
+            share = record.seconds / total * 100 if total else 0.0
+            lines.append(f"{name:<18} {record.calls:>6} {record.seconds:>10.4f} {share:>6.1f}% {peak:>9} "
+                         f"{record.bytes_read / 1048576:>9.2f} {record.bytes_written / 1048576:>11.2f} {rate:>12}")
+        return "\n".join(lines)
@@ -0,0 +1,90 @@
+"""
+Content-addressed tool registry
+
+Most agent files embed the same base tools (`send_message`,
+`archival_memory_search`, `conversation_search`, ...) with identical schemas
+and source code. The registry interns tool definitions by a hash of their
+content, so each distinct tool is held once however many files use it, and
+caches each tool's converted form per target format so it is built only
+once. Hashing every tool is only worth it when tools are shared, so
+converters only use a registry when one is passed in: batch conversions
+share one per worker process, and shared tool definitions need one.
+
+Outputs can also reference shared tool definitions instead of embedding
+them: `share_tools` swaps converted tools for `{"$ref": "tools.<format>.json#/<digest>"}`
+entries and returns the definitions to store in that shared file.
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+SHARED_TOOLS_FILE = "tools.{}.json"
+
+def tool_digest(tool: Dict[str, Any]) -> str:
+    """SHA-256 of a tool definition's canonical JSON"""
+    payload = json.dumps(tool, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def shared_tools_file(output_format: str) -> str:
+    """File name of the shared tool definitions of one output format"""
+    return SHARED_TOOLS_FILE.format(output_format)
+
+class ToolRegistry:
+    """Interns tool definitions by content and caches their converted forms
+    
+    Interned and converted tools are shared between every agent that uses
+    them, so they must not be modified.
+    """
+    
+    def __init__(self):
+        self._tools: Dict[str, Dict[str, Any]] = {}
+        self._converted: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # id() of every object handed out -> digest; the objects are kept
+        # alive by the registry, so ids are never reused while registered
+        self._digests: Dict[int, str] = {}
+    
+    def __len__(self) -> int:
+        return len(self._tools)
+    
+    def intern(self, tool: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the registered tool with the same content as `tool`, registering it if new"""
+        digest = tool_digest(tool)
+        interned = self._tools.setdefault(digest, tool)
+        self._digests[id(interned)] = digest
+        return interned
+    
+    def digest(self, tool: Dict[str, Any]) -> str:
+        """Digest of an interned or converted tool"""
+        return self._digests[id(tool)]
+    
+    def convert(self, target: str, tool: Dict[str, Any],
+                convert: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return `tool` converted by `convert` for `target`, converting each tool only once"""
+        key = (target, self._digests.get(id(tool)) or self.digest(self.intern(tool)))
+        converted = self._converted.get(key)
+        if converted is None:
+            converted = convert(tool)
+            self._converted[key] = converted
+            self._digests[id(converted)] = key[1]
+        return converted
+    
+    def clear(self) -> None:
+        """Forget every registered tool"""
+        self._tools.clear()
+        self._converted.clear()
+        self._digests.clear()
+
+def share_tools(tools: List[Dict[str, Any]], registry: ToolRegistry,
+                file_name: str) -> Tuple[List[Dict[str, str]], Dict[str, Dict[str, Any]]]:
+    """Replace converted tools by references into the shared file `file_name`
+    
+    Returns the references and the definitions (digest -> tool) they point to.
+    """
+    refs = []
+    definitions = {}
+    for tool in tools:
+        digest = registry.digest(tool)
+        definitions[digest] = tool
+        refs.append({"$ref": f"{file_name}#/{digest}"})
+    return refs, definitions
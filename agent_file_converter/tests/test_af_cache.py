@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test Conversion Cache
+
+Checks that repeated conversions are served from the cache and that the
+cache stays within its size bound.
+"""
+
+import os
+import time
+
+import pytest
+
+from src.af_cache import ConversionCache
+from src.af_converter import AgentFileConverter, convert_file
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def test_repeated_conversion_is_served_from_cache(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    first = convert_file(CONVO_FILE, "langchain,autogen", output_dir=str(tmp_path / "first"),
+                         include_history=True, cache_dir=cache_dir, verbose=False)
+    assert len(os.listdir(cache_dir)) == 2
+    
+    def fail(self):
+        raise AssertionError("cached conversions should not load the input")
+    monkeypatch.setattr(AgentFileConverter, "_load_agent_file", fail)
+    second = convert_file(CONVO_FILE, "langchain,autogen", output_dir=str(tmp_path / "second"),
+                          include_history=True, cache_dir=cache_dir, verbose=False)
+    for first_path, second_path in zip(first, second):
+        with open(first_path, "rb") as f, open(second_path, "rb") as g:
+            assert f.read() == g.read()
+    
+    # Different options are a different conversion
+    monkeypatch.undo()
+    convert_file(CONVO_FILE, "langchain", output_dir=str(tmp_path / "third"), cache_dir=cache_dir, verbose=False)
+    assert len(os.listdir(cache_dir)) == 3
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = ConversionCache(str(tmp_path), max_bytes=25)
+    for index, key in enumerate(["a", "b", "c"]):
+        cache.put(key, b"x" * 10)
+        # Make the use order visible to mtime-based eviction
+        used_at = time.time() - 100 + index
+        os.utime(os.path.join(str(tmp_path), key + ".json"), (used_at, used_at))
+    assert cache.get("a") is None
+    assert cache.get("b") == b"x" * 10
+    
+    # Reading "b" made it the most recently used entry
+    cache.put("d", b"y" * 10)
+    assert cache.get("c") is None
+    assert cache.get("b") is not None and cache.get("d") is not None
+    
+    cache.clear()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_unusable_cache_directory_does_not_fail_conversion(tmp_path):
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+    cache_dir = str(blocker / "cache")
+    cache = ConversionCache(cache_dir)
+    assert cache.get("a") is None
+    assert cache.put("a", b"x") is False
+    
+    output = convert_file(CONVO_FILE, "langchain", output_dir=str(tmp_path / "out"), cache_dir=cache_dir, verbose=False)
+    assert os.path.getsize(output[0]) > 0
+
+
+def test_json_backends_have_separate_entries(tmp_path):
+    pytest.importorskip("orjson")
+    cache_dir = str(tmp_path / "cache")
+    for backend in ("json", "orjson"):
+        convert_file(CONVO_FILE, "langchain", output_dir=str(tmp_path / backend), cache_dir=cache_dir,
+                     json_backend=backend, verbose=False)
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_writes_below_the_bound_do_not_scan_the_directory(tmp_path, monkeypatch):
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    for index in range(100):
+        ConversionCache(str(tmp_path)).put(f"entry-{index}", b"x" * 10)
+    assert len(scans) == 1
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Test Agent File Converter Core
+
+Unit tests for loading and converting the bundled .af files. Unlike the
+compatibility tests these need no framework installs, network or API keys.
+"""
+
+import glob
+import io
+import json
+import os
+import shutil
+
+import pytest
+
+from src.af_converter import (
+    JSON_BACKENDS,
+    AgentFileError,
+    AutoGenConverter,
+    LangChainConverter,
+    StreamingAgentFile,
+    _JsonStream,
+    convert_batch,
+    convert_file,
+    estimate_tokens,
+    get_json_backend,
+    read_agent_data,
+)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+AGENT_FILES = sorted(glob.glob(os.path.join(REPO_DIR, "*", "*.af")))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_streaming_loader_matches_json_load():
+    for path in AGENT_FILES:
+        expected = _load(path)
+        # A tiny chunk size forces values to straddle buffer boundaries
+        stream = StreamingAgentFile(path, chunk_size=97)
+        
+        messages = expected.pop("messages")
+        assert stream.header == expected
+        assert stream.message_count == len(messages)
+        assert list(stream.iter_messages()) == messages
+
+
+def test_stream_reads_numbers_split_at_chunk_boundaries():
+    text = '{"a": 12.5, "b": 1e5, "c": -3.25E-2, "d": [10, 0.5]}'
+    for chunk_size in range(1, len(text) + 1):
+        stream = _JsonStream(io.StringIO(text), chunk_size)
+        values = {}
+        for key in stream.iter_object_keys():
+            values[key] = stream.read_value()
+        assert values == json.loads(text)
+        # A bare top-level number is only complete at the end of the text
+        assert _JsonStream(io.StringIO("-12.5e3"), chunk_size).read_value() == -12.5e3
+
+
+def test_streaming_loader_selects_in_context_messages():
+    data = _load(CONVO_FILE)
+    indices = data["in_context_message_indices"]
+    stream = StreamingAgentFile(CONVO_FILE)
+    
+    assert stream.get_messages(indices) == [data["messages"][idx] for idx in indices]
+    assert stream.get_messages([len(data["messages"]) + 5]) == []
+
+
+def test_streaming_conversion_matches_eager_conversion():
+    for path in AGENT_FILES:
+        for converter_class in (LangChainConverter, AutoGenConverter):
+            eager = converter_class(path).convert()
+            streamed = converter_class(path, streaming=True).convert()
+            assert streamed == eager
+
+
+def test_invalid_file_raises_agent_file_error(tmp_path):
+    broken = tmp_path / "broken.af"
+    broken.write_text("{not json")
+    
+    for streaming in (False, True):
+        with pytest.raises(AgentFileError):
+            LangChainConverter(str(broken), streaming=streaming)
+    with pytest.raises(AgentFileError):
+        LangChainConverter(str(tmp_path / "missing.af"))
+
+
+def test_batch_conversion_isolates_failures(tmp_path):
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    for path in AGENT_FILES:
+        shutil.copy(path, input_dir)
+    (input_dir / "broken.af").write_text("{not json")
+    input_files = sorted(str(path) for path in input_dir.iterdir())
+    
+    summary = convert_batch(input_files, "autogen", output_dir=str(tmp_path / "out"), workers=2,
+                            include_history=True)
+    
+    assert summary["files"] == len(AGENT_FILES) + 1
+    assert summary["succeeded"] == len(AGENT_FILES)
+    assert [failure["input"] for failure in summary["failures"]] == [str(input_dir / "broken.af")]
+    for result in summary["results"]:
+        if not result["error"]:
+            with open(result["outputs"][0], "r", encoding="utf-8") as f:
+                assert json.load(f)["config"]["chat_history"]
+
+
+def test_batch_outputs_keep_paths_relative_to_input_dir(tmp_path):
+    input_dir = tmp_path / "in"
+    for name in ("a", "b"):
+        (input_dir / name).mkdir(parents=True)
+        shutil.copy(CONVO_FILE, input_dir / name / "agent.af")
+    input_files = sorted(str(path) for path in input_dir.glob("*/agent.af"))
+    
+    summary = convert_batch(input_files, "langchain", output_dir=str(tmp_path / "out"), workers=2,
+                            input_dir=str(input_dir))
+    assert summary["succeeded"] == 2
+    assert sorted(result["outputs"][0] for result in summary["results"]) == [
+        str(tmp_path / "out" / name / "agent.langchain.json") for name in ("a", "b")
+    ]
+    
+    # Without the input directory both would be written to one path
+    summary = convert_batch(input_files, "langchain", output_dir=str(tmp_path / "flat"), workers=2)
+    assert summary["failed"] == 2 and not os.path.exists(tmp_path / "flat" / "agent.langchain.json")
+
+
+def test_multiple_formats_share_one_normalization_pass(tmp_path):
+    loader = LangChainConverter(CONVO_FILE)
+    agent = loader.normalize()
+    autogen = AutoGenConverter.from_converter(loader)
+    
+    assert autogen.normalize() is agent
+    assert autogen.emit(agent) == AutoGenConverter(CONVO_FILE).convert()
+    autogen.reset_normalization()
+    assert autogen.normalize() is not agent and loader.normalize() is agent
+    
+    outputs = convert_file(CONVO_FILE, "langchain,autogen", output_dir=str(tmp_path), include_history=True)
+    assert [os.path.basename(path) for path in outputs] == [
+        "memgpt_agent_with_convo.langchain.json",
+        "memgpt_agent_with_convo.autogen.json",
+    ]
+    with pytest.raises(ValueError):
+        convert_file(CONVO_FILE, "langchain,autogen", output_file=str(tmp_path / "out.json"))
+    with pytest.raises(ValueError):
+        convert_file(CONVO_FILE, "crewai")
+
+
+def test_disabled_parts_are_not_computed(tmp_path):
+    eager = LangChainConverter(CONVO_FILE).convert()
+    converted = LangChainConverter(CONVO_FILE).convert(include_history=False)
+    assert "message_history" not in converted["config"]
+    assert converted["config"]["context_summary"] == eager["config"]["context_summary"]
+    
+    converted = AutoGenConverter(CONVO_FILE).convert(include_context_summary=False)
+    assert "context_summary" not in converted["config"]
+    assert converted["config"]["chat_history"]
+    
+    # With a top-level system prompt nothing else requires the messages
+    data = _load(CONVO_FILE)
+    data["system"] = "You are a test agent."
+    path = tmp_path / "agent.af"
+    path.write_text(json.dumps(data))
+    converter = LangChainConverter(str(path))
+    
+    def fail():
+        raise AssertionError("messages should not be walked")
+    converter.iter_messages = fail
+    converted = converter.convert(include_history=False, include_context_summary=False)
+    assert converted["config"]["system_message"] == "You are a test agent."
+
+
+def _installed_backends():
+    backends = []
+    for name in JSON_BACKENDS:
+        try:
+            backends.append(get_json_backend(name))
+        except ImportError:
+            pass
+    return backends
+
+
+def test_json_backends_round_trip(tmp_path):
+    expected = LangChainConverter(CONVO_FILE, json_backend="json").convert()
+    
+    for backend in _installed_backends():
+        converter = LangChainConverter(CONVO_FILE, json_backend=backend)
+        assert converter.convert() == expected
+        
+        for compact in (False, True):
+            output = tmp_path / f"{backend.name}.{compact}.json"
+            converter.save(str(output), expected, verbose=False, compact=compact)
+            assert _load(output) == expected
+            assert (b"\n" in output.read_bytes()) is not compact
+
+
+def test_unknown_json_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_json_backend("yaml")
+    assert get_json_backend("json").name == "json"
+
+
+def test_compressed_agent_files_are_read_transparently(tmp_path):
+    import gzip
+    
+    expected = LangChainConverter(CONVO_FILE).convert()
+    compressed = tmp_path / "agent.af.gz"
+    with open(CONVO_FILE, "rb") as src, gzip.open(compressed, "wb") as dst:
+        dst.write(src.read())
+    # The extension is irrelevant for reading, only the magic bytes count
+    renamed = tmp_path / "agent.af"
+    shutil.copy(compressed, renamed)
+    
+    for path in (compressed, renamed):
+        for streaming in (False, True):
+            assert LangChainConverter(str(path), streaming=streaming).convert() == expected
+    
+    outputs = convert_file(str(compressed), "langchain", output_dir=str(tmp_path / "out"),
+                           include_history=True, compression="gzip")
+    assert outputs == [str(tmp_path / "out" / "agent.langchain.json.gz")]
+    with gzip.open(outputs[0], "rb") as f:
+        assert json.loads(f.read()) == expected
+
+
+def test_zstd_agent_files_round_trip(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    
+    compressed = tmp_path / "agent.af.zst"
+    with open(CONVO_FILE, "rb") as f:
+        compressed.write_bytes(zstandard.ZstdCompressor().compress(f.read()))
+    converter = AutoGenConverter(str(compressed), streaming=True)
+    converted = converter.convert()
+    assert converted == AutoGenConverter(CONVO_FILE).convert()
+    
+    output = tmp_path / "agent.autogen.json.zst"
+    converter.save(str(output), converted, verbose=False)
+    with zstandard.ZstdDecompressor().stream_reader(open(output, "rb")) as f:
+        assert json.loads(f.read()) == converted
+    
+    # A corrupt frame is reported like corrupt gzip or JSON input
+    corrupt = tmp_path / "corrupt.af.zst"
+    corrupt.write_bytes(compressed.read_bytes()[:4] + b"\xff" * 64)
+    for streaming in (False, True):
+        with pytest.raises(AgentFileError):
+            AutoGenConverter(str(corrupt), streaming=streaming)
+
+
+def test_memory_mapped_reading_matches_regular_reading(tmp_path):
+    expected = _load(CONVO_FILE)
+    
+    for backend in _installed_backends():
+        assert read_agent_data(CONVO_FILE, backend, use_mmap=True) == expected
+        converter = AutoGenConverter(CONVO_FILE, json_backend=backend, use_mmap=True)
+        assert converter.convert() == AutoGenConverter(CONVO_FILE, use_mmap=False).convert()
+    
+    # Compressed and empty files fall back to regular reads
+    import gzip
+    compressed = tmp_path / "agent.af.gz"
+    with gzip.open(compressed, "wb") as f:
+        f.write(json.dumps(expected).encode("utf-8"))
+    assert read_agent_data(str(compressed), get_json_backend("json"), use_mmap=True) == expected
+    
+    empty = tmp_path / "empty.af"
+    empty.write_bytes(b"")
+    with pytest.raises(AgentFileError):
+        LangChainConverter(str(empty), use_mmap=True)
+
+
+def test_context_summary_fits_token_budget(tmp_path):
+    converter = LangChainConverter(CONVO_FILE)
+    context_messages = [{"role": "system", "content": "ignored"}] + [
+        {"role": "user" if i % 2 else "assistant", "content": f"message {i} " + "word " * 30}
+        for i in range(10)
+    ]
+    full_lines = converter._create_context_summary(context_messages).splitlines()
+    
+    for budget in (30, 120, 300):
+        summary = converter._create_context_summary(context_messages, budget)
+        lines = summary.splitlines()
+        
+        assert converter.token_counter(summary) <= budget
+        assert lines[0] == "Context summary:"
+        # The message crossing the budget is truncated, the most recent are kept
+        assert full_lines[-len(lines) + 1].startswith(lines[1][:-len("...")])
+        assert lines[2:] == full_lines[len(full_lines) - len(lines) + 2:]
+    
+    for budget in (10**6, None):
+        assert converter._create_context_summary(context_messages, budget).splitlines() == full_lines
+    
+    # The budget also applies end to end and keeps the latest context
+    summary = LangChainConverter(CONVO_FILE, summary_budget=200).convert()["config"]["context_summary"]
+    assert estimate_tokens(summary) <= 200
+    full = LangChainConverter(CONVO_FILE).convert()["config"]["context_summary"]
+    assert full.endswith(summary[-100:])
+    
+    # A small model context window caps the summary even without a budget
+    data = _load(CONVO_FILE)
+    data["llm_config"]["context_window"] = 20000
+    path = tmp_path / "small_window.af"
+    path.write_text(json.dumps(data))
+    converter = AutoGenConverter(str(path), token_counter=len)
+    config = converter.convert(include_history=False)["config"]
+    used = len(config["system_message"]) + sum(len(value) for value in config["memory"].values())
+    used += sum(len(json.dumps(tool, separators=(",", ":"))) for tool in config["tools"])
+    assert 0 < len(config["context_summary"]) <= 20000 - used
+    
+    # Only system messages in context: the budget leaves the header-only summary alone
+    system_only = [{"role": "system", "content": "You are an agent."}]
+    assert converter._create_context_summary(system_only, 100) == converter._create_context_summary(system_only)
+    assert converter._create_context_summary(system_only, 100) == "Context summary:\n"
+    
+    # When nothing fits the summary is left empty
+    assert converter._create_context_summary(context_messages, 5) == ""
+
+
+def test_native_export_fields_are_mapped(tmp_path):
+    agent_file = os.path.join(REPO_DIR, "deep_research_agent", "deep_research_agent.af")
+    data = _load(agent_file)
+    converter = LangChainConverter(agent_file)
+    
+    def fail():
+        raise AssertionError("messages should not be walked")
+    converter.iter_messages = fail
+    config = converter.convert(include_history=False, include_context_summary=False)["config"]
+    assert config["system_message"] == data["system"]
+    assert config["memory"] == {block["label"]: block["value"] for block in data["core_memory"]
+                                if block["value"]}
+    assert config["model"]["provider"] == data["llm_config"]["model_endpoint_type"]
+    assert config["model"]["max_tokens"] == data["llm_config"]["max_tokens"]
+    index, tool = next((i, tool) for i, tool in enumerate(data["tools"]) if tool["source_code"])
+    assert config["tools"][index] == {
+        "name": tool["name"],
+        "description": tool["description"],
+        "parameters": tool["json_schema"]["parameters"],
+        "function_string": tool["source_code"]
+    }
+    
+    config = AutoGenConverter(agent_file).convert(include_history=False)["config"]
+    assert config["tools"][index]["parameters"] == tool["json_schema"]["parameters"]["properties"]
+    assert config["tools"][index]["implementation"] == tool["source_code"]
+    
+    # Unversioned files keep the legacy key names
+    legacy = {
+        "system_prompt": "You are a legacy agent.",
+        "memory_blocks": [{"label": "persona", "value": "Legacy persona"}],
+        "model_config": {"model": "openai/gpt-4", "temperature": 0.2},
+        "tools": [{"name": "echo", "description": "Echo", "schema": {"properties": {"text": {"type": "string"}}},
+                   "code": "def echo(text): return text"}],
+        "messages": []
+    }
+    path = tmp_path / "legacy.af"
+    path.write_text(json.dumps(legacy))
+    config = AutoGenConverter(str(path)).convert()["config"]
+    assert config["system_message"] == "You are a legacy agent."
+    assert config["memory"] == {"persona": "Legacy persona"}
+    assert config["model"] == {"model_name": "gpt-4", "temperature": 0.2, "max_tokens": None}
+    assert config["tools"] == [{"name": "echo", "description": "Echo", "parameters": {"text": {"type": "string"}},
+                                "implementation": "def echo(text): return text"}]
+
+
+def test_tool_returns_are_paired_with_their_calls(tmp_path):
+    def call(call_id, name):
+        return {"id": call_id, "type": "function", "function": {"name": name, "arguments": "{}"}}
+    
+    data = {
+        "version": "0.6.47",
+        "system": "You are a test agent.",
+        "messages": [
+            {"role": "user", "content": [{"type": "text", "text": "hi"}]},
+            {"role": "assistant", "content": [], "tool_calls": [call("a", "search"), call("b", "lookup")]},
+            {"role": "tool", "tool_call_id": "b", "name": "lookup", "content": [{"type": "text", "text": "B"}]},
+            {"role": "tool", "tool_call_id": "orphan", "name": "x", "content": [{"type": "text", "text": "?"}]},
+            {"role": "assistant", "content": [{"type": "text", "text": "thinking"}], "tool_calls": [call("c", "send")]},
+            {"role": "tool", "tool_call_id": "a", "content": [{"type": "text", "text": "A"}]},
+            {"role": "tool", "tool_call_id": "c", "name": "send", "content": [{"type": "text", "text": "C"}]}
+        ]
+    }
+    path = tmp_path / "tools.af"
+    path.write_text(json.dumps(data))
+    
+    history = LangChainConverter(str(path)).convert()["config"]["message_history"]
+    assert [(entry["type"], entry["data"].get("tool_call_id")) for entry in history] == [
+        ("human", None), ("ai", None), ("tool", "b"), ("tool", "a"), ("ai", None), ("tool", "c")
+    ]
+    assert [call["id"] for call in history[1]["data"]["additional_kwargs"]["tool_calls"]] == ["a", "b"]
+    # The tool name falls back to the call's when the tool message has none
+    assert history[3]["data"] == {"content": "A", "tool_call_id": "a", "name": "search"}
+    
+    history = AutoGenConverter(str(path)).convert()["config"]["chat_history"]
+    assert [(entry["role"], entry.get("name")) for entry in history] == [
+        ("human", None), ("assistant", None), ("function", "lookup"), ("function", "search"),
+        ("assistant", None), ("function", "send")
+    ]
+    
+    # Every tool message of a real export is paired
+    data = _load(CONVO_FILE)
+    call_ids = {call["id"] for msg in data["messages"] if msg["role"] == "assistant" for call in msg["tool_calls"]}
+    returns = [msg for msg in data["messages"] if msg["role"] == "tool" and msg["tool_call_id"] in call_ids]
+    history = LangChainConverter(CONVO_FILE).convert()["config"]["message_history"]
+    assert len([entry for entry in history if entry["type"] == "tool"]) == len(returns)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("converter_class", [LangChainConverter, AutoGenConverter])
+def test_streamed_output_matches_saved_output(tmp_path, converter_class, compact):
+    for path in AGENT_FILES:
+        converter = converter_class(path)
+        expected = converter.save(str(tmp_path / "saved.json"), converter.convert(), verbose=False, compact=compact)
+        
+        streamed = converter_class(path, streaming=True)
+        count = streamed.save_streaming(str(tmp_path / "streamed.json"), compact=compact, verbose=False)
+        assert (tmp_path / "streamed.json").read_bytes() == expected
+        assert count == len(json.loads(expected)["config"][converter_class.history_key])
+
+
+def test_streamed_history_holds_back_unanswered_calls(tmp_path):
+    def call(call_id):
+        return {"id": call_id, "type": "function", "function": {"name": "search", "arguments": "{}"}}
+    
+    data = {"system": "s", "messages": [
+        {"role": "assistant", "content": [], "tool_calls": [call("a")]},
+        {"role": "user", "content": [{"type": "text", "text": "one"}]},
+        {"role": "user", "content": [{"type": "text", "text": "two"}]},
+        {"role": "tool", "tool_call_id": "a", "content": [{"type": "text", "text": "A"}]}
+    ]}
+    path = tmp_path / "late.af"
+    path.write_text(json.dumps(data))
+    
+    converter = LangChainConverter(str(path))
+    entries = list(converter.iter_history())
+    assert entries == converter.normalize().history
+    assert entries[0]["tool_returns"][0]["content"] == "A"
+    
+    # Past the limit the call is written without its late result
+    converter.stream_pending_limit = 1
+    assert list(converter.iter_history())[0]["tool_returns"] == []
+    
+    with pytest.raises(ValueError):
+        convert_file(str(path), "langchain", output_dir=str(tmp_path), include_history=True,
+                     stream_output=True, shared_tools=True)
+
+
+def test_jsonl_history_matches_converted_history(tmp_path):
+    outputs = convert_file(CONVO_FILE, "langchain,autogen", output_dir=str(tmp_path), jsonl=True, manifest=True,
+                           verbose=False)
+    assert [os.path.basename(path) for path in outputs] == [
+        "memgpt_agent_with_convo.langchain.jsonl", "memgpt_agent_with_convo.autogen.jsonl"
+    ]
+    
+    for converter_class, path in zip((LangChainConverter, AutoGenConverter), outputs):
+        expected = converter_class(CONVO_FILE).convert()
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        assert lines == expected["config"].pop(converter_class.history_key)
+        
+        # The manifest holds everything else and points at the history file
+        manifest = _load(path[:-len(".jsonl")] + ".manifest.json")
+        assert manifest.pop("history") == {"file": os.path.basename(path), "format": "jsonl",
+                                           "key": converter_class.history_key, "messages": len(lines)}
+        assert manifest == expected
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test Incremental Conversion
+
+Checks that converting appended messages only gives the same output as a
+full conversion.
+"""
+
+import json
+import os
+
+from src.af_converter import AutoGenConverter, LangChainConverter, convert_file
+from src.af_incremental import APPENDED, REBUILT, UNCHANGED, convert_incremental, state_path
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def _write_agent(path, data, message_count):
+    data = dict(data, messages=data["messages"][:message_count])
+    path.write_text(json.dumps(data))
+
+
+def test_incremental_conversion_matches_full_conversion(tmp_path):
+    with open(CONVO_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # Stop right after a tool call, before the tool message with its result
+    cut = next(idx for idx, msg in enumerate(data["messages"])
+               if idx > len(data["messages"]) // 2 and msg["role"] == "assistant" and msg["tool_calls"])
+    agent_file = tmp_path / "agent.af"
+    
+    for converter_class in (LangChainConverter, AutoGenConverter):
+        output_file = str(tmp_path / f"{converter_class.__name__}.json")
+        
+        _write_agent(agent_file, data, cut + 1)
+        assert convert_incremental(converter_class(str(agent_file)), output_file, verbose=False) == REBUILT
+        assert convert_incremental(converter_class(str(agent_file)), output_file, verbose=False) == UNCHANGED
+        
+        _write_agent(agent_file, data, len(data["messages"]))
+        converter = converter_class(str(agent_file))
+        assert convert_incremental(converter, output_file, verbose=False) == APPENDED
+        with open(output_file, "r", encoding="utf-8") as f:
+            assert json.load(f) == converter_class(str(agent_file)).convert()
+        # The conversion only covered the messages from the pending tool call on
+        assert list(converter._normalized) == [(True, True, cut)]
+        
+        # Streaming reads the same state
+        converter = converter_class(str(agent_file), streaming=True)
+        assert convert_incremental(converter, output_file, verbose=False) == UNCHANGED
+    
+    # A changed prefix forces a full rebuild, e.g. old messages replaced by a summary
+    edited = json.loads(json.dumps(data))
+    edited["messages"][1] = {"role": "user", "created_at": "2025-04-02T00:00:00",
+                             "content": [{"type": "text", "text": "Summary of earlier messages"}]}
+    _write_agent(agent_file, edited, len(edited["messages"]))
+    output_file = str(tmp_path / "LangChainConverter.json")
+    assert convert_incremental(LangChainConverter(str(agent_file)), output_file, verbose=False) == REBUILT
+    
+    outputs = convert_file(str(agent_file), "autogen", output_dir=str(tmp_path / "out"),
+                           include_history=True, incremental=True, verbose=False)
+    assert os.path.exists(state_path(outputs[0]))
+
+
+def test_changed_output_options_rebuild_the_output(tmp_path):
+    output_file = str(tmp_path / "agent.langchain.json")
+    assert convert_incremental(LangChainConverter(CONVO_FILE), output_file, verbose=False) == REBUILT
+    assert convert_incremental(LangChainConverter(CONVO_FILE), output_file, compact=True, verbose=False) == REBUILT
+    with open(output_file, "r", encoding="utf-8") as f:
+        assert "\n" not in f.read().strip()
+    assert convert_incremental(LangChainConverter(CONVO_FILE), output_file, compact=True, verbose=False) == UNCHANGED
+    assert convert_incremental(LangChainConverter(CONVO_FILE, summary_budget=100), output_file,
+                               compact=True, verbose=False) == REBUILT
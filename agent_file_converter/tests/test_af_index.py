@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test Message Index
+
+Checks that indexed queries return the same messages as scanning the agent
+files, and that rebuilding only reloads changed files.
+"""
+
+import json
+import os
+import shutil
+
+from src.af_index import MessageIndex, find_agent_files
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_queries_match_a_scan_of_the_file(tmp_path):
+    data = _load(CONVO_FILE)
+    messages = data["messages"]
+    with MessageIndex(str(tmp_path / "index.sqlite3")) as index:
+        summary = index.build(find_agent_files([os.path.join(REPO_DIR, "memgpt_agent")]))
+        assert summary["indexed"] == 2 and not summary["failed"]
+        
+        users = index.query(agent="memgpt_agent", role="user", limit=None)
+        assert [(msg["path"], msg["index"]) for msg in users if msg["path"] == CONVO_FILE] == [
+            (CONVO_FILE, idx) for idx, msg in enumerate(messages) if msg["role"] == "user"
+        ]
+        
+        since, until = messages[10]["created_at"], messages[20]["created_at"]
+        window = index.query(since=since, until=until, limit=None)
+        assert [msg["index"] for msg in window] == [
+            idx for idx, msg in enumerate(messages) if since <= msg["created_at"] < until
+        ]
+        
+        # A tool name finds both the calls and the tool messages answering them
+        calls = {call["id"] for msg in messages for call in msg["tool_calls"]
+                 if call["function"]["name"] == "core_memory_replace"}
+        found = index.query(tool_name="core_memory_replace", limit=None)
+        assert [msg["index"] for msg in found] == [
+            idx for idx, msg in enumerate(messages)
+            if calls & {call["id"] for call in msg["tool_calls"]} or msg["tool_call_id"] in calls
+        ]
+        assert found[0]["tool_calls"][0]["name"] == "core_memory_replace"
+        
+        pair = index.query(tool_call_id=found[0]["tool_calls"][0]["id"])
+        assert [msg["role"] for msg in pair] == ["assistant", "tool"]
+        assert index.query(role="user", limit=2, offset=1) == index.query(role="user", limit=3)[1:]
+
+
+def test_rebuild_reloads_only_changed_files(tmp_path):
+    agent_file = tmp_path / "agent.af"
+    shutil.copy(CONVO_FILE, agent_file)
+    bad_file = tmp_path / "bad.af"
+    bad_file.write_text("{not json")
+    index_path = str(tmp_path / "index.sqlite3")
+    
+    with MessageIndex(index_path) as index:
+        summary = index.build([str(agent_file), str(bad_file)])
+        assert summary["indexed"] == 1
+        assert [failure["path"] for failure in summary["failed"]] == [str(bad_file)]
+        assert index.build([str(agent_file)])["unchanged"] == 1
+    
+    data = _load(CONVO_FILE)
+    data["messages"] = data["messages"][:10]
+    agent_file.write_text(json.dumps(data))
+    with MessageIndex(index_path, streaming=True) as index:
+        assert index.build([str(agent_file)])["indexed"] == 1
+        assert index.agents()[0]["message_count"] == 10
+        assert len(index.query(limit=None)) == 10
+        assert index.remove(str(agent_file))
+        assert index.query() == []
+
+
+def test_index_of_another_schema_version_is_rebuilt(tmp_path):
+    index_path = str(tmp_path / "index.sqlite3")
+    with MessageIndex(index_path) as index:
+        index.build([CONVO_FILE])
+        index.connection.execute("PRAGMA user_version = 0")
+        index.connection.commit()
+    
+    with MessageIndex(index_path) as index:
+        assert index.agents() == []
+        assert index.build([CONVO_FILE])["indexed"] == 1
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test Agent File Schema Model
+
+Checks that the typed message model decodes the bundled exports faithfully.
+"""
+
+import json
+import os
+
+from src.af_schema import ContentPart, Message
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def test_messages_decode_faithfully():
+    with open(CONVO_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    
+    for raw_message in data["messages"]:
+        message = Message.from_dict(raw_message)
+        assert message.role == raw_message["role"]
+        assert message.created_at == raw_message["created_at"]
+        assert message.tool_call_id == raw_message["tool_call_id"]
+        assert [call.id for call in message.tool_calls] == [call["id"] for call in raw_message["tool_calls"]]
+        for call, raw_call in zip(message.tool_calls, raw_message["tool_calls"]):
+            assert call.name == raw_call["function"]["name"]
+            assert call.arguments == raw_call["function"]["arguments"]
+
+
+def test_message_text_handles_all_content_shapes():
+    assert Message.from_dict({"role": "user", "content": "plain"}).text == "plain"
+    assert Message.from_dict({"role": "user"}).text == ""
+    
+    message = Message.from_dict({"role": "user", "content": [
+        {"type": "text", "text": "first"},
+        {"type": "image", "url": "ignored"},
+        "second"
+    ]})
+    assert isinstance(message.content[0], ContentPart)
+    assert message.text == "first\nsecond"
+
+
+def test_tool_call_without_function_has_no_name():
+    message = Message.from_dict({"role": "assistant", "tool_calls": [{"id": "call-1"}]})
+    assert message.tool_calls[0].id == "call-1"
+    assert message.tool_calls[0].name is None
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test Conversation Search
+
+Checks that the inverted index ranks and pages matching messages, survives a
+save and load, and re-indexes only what changed in a file.
+"""
+
+import json
+import os
+import shutil
+
+from src.af_converter import AgentFileConverter
+from src.af_search import SearchIndex, _searchable_text, tokenize
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _matching(word):
+    converter = AgentFileConverter(CONVO_FILE)
+    return {idx for idx, msg in enumerate(converter.iter_messages())
+            if msg.role in ("user", "assistant") and word in tokenize(_searchable_text(msg))}
+
+
+def test_search_ranks_and_pages_matches(tmp_path):
+    index = SearchIndex()
+    summary = index.build([CONVO_FILE])
+    assert summary["indexed"] == 1 and not summary["failed"]
+    
+    word = "sarah"
+    expected = _matching(word)
+    found = index.search(word, page_size=1000)
+    assert found["total"] == len(expected) > 0
+    assert {result["index"] for result in found["results"]} == expected
+    scores = [result["score"] for result in found["results"]]
+    assert scores == sorted(scores, reverse=True)
+    
+    pages = [index.search(word, page=page, page_size=2)["results"] for page in range(3)]
+    assert [result["index"] for page in pages for result in page] == [
+        result["index"] for result in found["results"][:6]
+    ]
+    assert index.search("zzzunmatchedzzz")["total"] == 0
+    assert index.conversation_search("zzzunmatchedzzz") == "No results found."
+    assert index.conversation_search(word).startswith(f"Showing {min(5, len(expected))} of {len(expected)} results")
+    
+    path = str(tmp_path / "history.afsi")
+    assert index.save(path) < os.path.getsize(CONVO_FILE)
+    assert SearchIndex.load(path).search(word, page_size=1000) == found
+
+
+def test_rebuild_indexes_only_changed_messages(tmp_path):
+    agent_file = tmp_path / "agent.af"
+    data = _load(CONVO_FILE)
+    messages = data["messages"]
+    data["messages"] = messages[:20]
+    agent_file.write_text(json.dumps(data))
+    index_path = str(tmp_path / "history.afsi")
+    
+    index = SearchIndex()
+    index.build([str(agent_file)])
+    index.save(index_path)
+    
+    # Appended messages are added to the existing documents
+    data["messages"] = messages
+    agent_file.write_text(json.dumps(data))
+    index = SearchIndex.load(index_path)
+    before = index.document_count
+    assert index.build([str(agent_file)])["documents"] == index.document_count - before
+    assert index.build([str(agent_file)])["unchanged"] == 1
+    
+    # Rewritten history replaces the file's documents
+    data["messages"] = messages[20:]
+    agent_file.write_text(json.dumps(data))
+    index = SearchIndex.load(index_path)
+    index.build([str(agent_file)])
+    index.save(index_path)
+    index = SearchIndex.load(index_path)
+    
+    fresh = SearchIndex()
+    shutil.copy(agent_file, tmp_path / "copy.af")
+    fresh.build([str(tmp_path / "copy.af")])
+    assert index.document_count == fresh.document_count
+    found, expected = index.search("memory", page_size=1000), fresh.search("memory", page_size=1000)
+    assert [(r["index"], r["score"]) for r in found["results"]] == [(r["index"], r["score"]) for r in expected["results"]]
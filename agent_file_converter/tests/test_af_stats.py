@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test Conversion Statistics
+
+Checks that each conversion stage is recorded with its time, memory, bytes
+and messages, and that cProfile dumps are written per stage.
+"""
+
+import json
+import os
+import pstats
+
+from src.af_converter import convert_batch, convert_file
+from src.af_stats import ConversionStats
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def test_each_stage_is_recorded(tmp_path):
+    stats = ConversionStats(trace_memory=True, profile_dir=str(tmp_path / "profiles"))
+    outputs = convert_file(CONVO_FILE, "langchain,autogen", output_dir=str(tmp_path), include_history=True,
+                           stats=stats, verbose=False)
+    
+    result = stats.as_dict()
+    stages = result["stages"]
+    assert list(stages) == ["load", "normalize", "tools", "context_summary", "message_history", "save"]
+    # The file is loaded and normalized once, then emitted and saved per format
+    assert stages["load"]["calls"] == stages["normalize"]["calls"] == 1
+    assert stages["message_history"]["calls"] == stages["save"]["calls"] == 2
+    assert stages["load"]["bytes_read"] == os.path.getsize(CONVO_FILE)
+    assert stages["load"]["messages"] == 91
+    assert stages["save"]["bytes_written"] == sum(os.path.getsize(path) for path in outputs)
+    assert all(values["peak_bytes"] > 0 for values in stages.values())
+    assert stages["message_history"]["messages_per_second"] > 0
+    assert abs(result["seconds"] - sum(values["seconds"] for values in stages.values())) < 1e-9
+    
+    stats.write_json(str(tmp_path / "stats.json"))
+    with open(tmp_path / "stats.json", encoding="utf-8") as f:
+        assert json.load(f) == json.loads(json.dumps(result))
+    profile = pstats.Stats(str(tmp_path / "profiles" / "message_history.prof"))
+    assert any(name == "_convert_message_history" for _, _, name in profile.stats)
+
+
+def test_batch_stats_are_merged(tmp_path):
+    stats = ConversionStats()
+    summary = convert_batch([CONVO_FILE, CONVO_FILE], "langchain", output_dir=str(tmp_path), workers=1,
+                            include_history=True, stats=stats)
+    
+    assert summary["failed"] == 0
+    assert summary["results"][0]["stats"]["stages"]["load"]["calls"] == 1
+    assert stats.stages["load"].calls == 2
+    assert stats.stages["load"].peak_bytes is None
+    assert stats.stages["message_history"].messages == 2 * summary["results"][0]["stats"]["stages"]["message_history"]["messages"]
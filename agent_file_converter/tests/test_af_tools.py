@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test Tool Registry
+
+Checks that identical tools are interned across agent files and that
+shared tool definitions resolve to the embedded ones.
+"""
+
+import json
+import os
+
+import pytest
+
+from src.af_converter import LangChainConverter, convert_batch, convert_file
+from src.af_tools import ToolRegistry
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MEMGPT_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent.af")
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+CUSTOMER_SERVICE_FILE = os.path.join(REPO_DIR, "customer_service_agent", "customer_service.af")
+
+
+def test_identical_tools_are_interned_and_converted_once():
+    registry = ToolRegistry()
+    first = LangChainConverter(MEMGPT_FILE, tool_registry=registry)
+    second = LangChainConverter(CONVO_FILE, tool_registry=registry)
+    first_tools = {tool["name"]: tool for tool in first.convert(include_history=False)["config"]["tools"]}
+    second_tools = {tool["name"]: tool for tool in second.convert(include_history=False)["config"]["tools"]}
+    
+    # Both agents carry the same base tools, which are held and converted once
+    shared = set(first_tools) & set(second_tools)
+    assert "archival_memory_search" in shared
+    identical = [name for name in shared if first_tools[name] == second_tools[name]]
+    assert identical
+    assert all(first_tools[name] is second_tools[name] for name in identical)
+    
+    # Converting again reuses the converted objects
+    assert LangChainConverter(MEMGPT_FILE, tool_registry=registry).convert()["config"]["tools"] == \
+        list(first_tools.values())
+    assert len(registry) < len(first_tools) + len(second_tools)
+
+
+def _resolve(output_file):
+    with open(output_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    tools = []
+    for ref in data["config"]["tools"]:
+        file_name, digest = ref["$ref"].split("#/")
+        with open(os.path.join(os.path.dirname(output_file), file_name), "r", encoding="utf-8") as f:
+            tools.append(json.load(f)[digest])
+    data["config"]["tools"] = tools
+    return data
+
+
+def test_shared_tool_definitions_resolve_to_embedded_tools(tmp_path):
+    inputs = [MEMGPT_FILE, CUSTOMER_SERVICE_FILE]
+    convert_batch(inputs, "langchain,autogen", output_dir=str(tmp_path / "shared"), workers=2,
+                  shared_tools=True)
+    convert_file(CONVO_FILE, "langchain,autogen", output_dir=str(tmp_path / "shared"), shared_tools=True,
+                 verbose=False)
+    convert_batch(inputs + [CONVO_FILE], "langchain,autogen", output_dir=str(tmp_path / "embedded"), workers=1)
+    
+    for output_file in sorted(os.listdir(tmp_path / "embedded")):
+        with open(tmp_path / "embedded" / output_file, "r", encoding="utf-8") as f:
+            embedded = json.load(f)
+        assert _resolve(str(tmp_path / "shared" / output_file)) == embedded
+
+
+def test_conversions_without_a_registry_do_not_share_tools():
+    first = LangChainConverter(MEMGPT_FILE).convert(include_history=False)["config"]["tools"]
+    first[0]["description"] = "changed"
+    second = LangChainConverter(CONVO_FILE).convert(include_history=False)["config"]["tools"]
+    assert all(tool["description"] != "changed" for tool in second)
+
+
+def test_shared_tools_are_only_rejected_with_incremental_history(tmp_path):
+    outputs = convert_file(MEMGPT_FILE, "langchain", output_dir=str(tmp_path), shared_tools=True,
+                           incremental=True, verbose=False)
+    assert _resolve(outputs[0])["config"]["tools"]
+    with pytest.raises(ValueError):
+        convert_file(MEMGPT_FILE, "langchain", output_dir=str(tmp_path), shared_tools=True,
+                     incremental=True, include_history=True, verbose=False)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Test Converter Benchmark
+
+Checks that synthetic agent files load like real ones and that a benchmark
+run reports every stage.
+"""
+
+import os
+
+from src.af_converter import LangChainConverter
+from utils.converter_benchmark import benchmark_file, generate_agent_file
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def test_synthetic_agent_file_converts(tmp_path):
+    path = generate_agent_file(str(tmp_path / "synthetic.af"), 100, memory_kb=4, template_file=CONVO_FILE)
+    converter = LangChainConverter(path)
+    
+    assert converter.message_count == 100
+    config = converter.convert()["config"]
+    assert all(len(value) == 4 * 1024 for value in config["memory"].values())
+    # Tool calls are followed by their tool messages
+    tool_messages = [entry for entry in config["message_history"] if entry["type"] == "tool"]
+    assert len(tool_messages) == 33
+
+
+def test_benchmark_reports_each_stage(tmp_path):
+    path = generate_agent_file(str(tmp_path / "synthetic.af"), 50, memory_kb=1, template_file=CONVO_FILE)
+    result = benchmark_file(path, ["langchain", "autogen"], str(tmp_path))
+    
+    assert result["messages"] == 50
+    assert list(result["stages"]) == ["load", "convert:langchain", "save:langchain",
+                                      "convert:autogen", "save:autogen"]
+    for values in result["stages"].values():
+        assert values["seconds"] > 0
+        assert values["peak_bytes"] > 0
+    assert result["stages"]["save:langchain"]["output_bytes"] == os.path.getsize(tmp_path / "benchmark_langchain.json")
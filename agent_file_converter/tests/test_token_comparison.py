@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test Token Accounting
+
+Checks the BPE tokenizer against a tiny hand-made vocab and the per-section
+token counts of a converted agent.
+"""
+
+import base64
+import os
+
+from src.af_converter import AutoGenConverter, LangChainConverter
+from utils.token_comparison import BPETokenizer, HeuristicTokenizer, count_sections, load_tokenizer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVO_FILE = os.path.join(REPO_DIR, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+
+def _write_vocab(path):
+    tokens = [bytes([i]) for i in range(256)] + [b"he", b"ll", b"hell"]
+    with open(path, "wb") as f:
+        for rank, token in enumerate(tokens):
+            f.write(base64.b64encode(token) + b" " + str(rank).encode() + b"\n")
+
+
+def test_bpe_tokenizer_merges_by_rank(tmp_path):
+    vocab = tmp_path / "tiny.tiktoken"
+    _write_vocab(vocab)
+    tokenizer = load_tokenizer(str(vocab))
+    
+    assert isinstance(tokenizer, BPETokenizer)
+    # "hello" merges he, then ll, then hell; " world" has no merges
+    assert tokenizer.encode("hello world") == [258, ord("o")] + list(b" world")
+    # " hello" is a separate pre-token: " ", "hell", "o"
+    assert tokenizer.count("hello hello") == 2 + 3
+    # Non-ASCII text falls back to single bytes
+    assert tokenizer.count("é") == 2
+
+
+def test_count_sections_covers_every_section():
+    tokenizer = HeuristicTokenizer()
+    for converter_class in (LangChainConverter, AutoGenConverter):
+        converted = converter_class(CONVO_FILE).convert()
+        counts = count_sections(converted, tokenizer)
+        config = converted["config"]
+        
+        assert counts["system_prompt"] == tokenizer.count(config["system_message"])
+        assert counts["context_summary"] == tokenizer.count(config["context_summary"])
+        assert counts["history"] > 0
+        assert {f"tool:{tool['name']}" for tool in config["tools"]} <= set(counts)
+        assert {f"memory:{label}" for label in config["memory"]} <= set(counts)
+        
+        converted = converter_class(CONVO_FILE).convert(include_history=False)
+        assert "history" not in count_sections(converted, tokenizer)
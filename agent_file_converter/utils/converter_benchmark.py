@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Converter Benchmark
+
+This script generates synthetic .af files modeled on the bundled MemGPT agent
+with conversation, from 10^2 up to 10^6 messages with tool calls, multi-part
+content and large memory blocks. It then times and memory-profiles loading,
+`convert()` for each target format and `save`. Results are stored as JSON
+together with the commit they were measured on, so two runs can be compared.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(script_dir), "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from af_converter import CONVERTERS, get_json_backend
+
+project_dir = os.path.dirname(script_dir)
+repo_dir = os.path.dirname(project_dir)
+TEMPLATE_FILE = os.path.join(repo_dir, "memgpt_agent", "memgpt_agent_with_convo.af")
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+USER_MESSAGES = [
+    "hi, can you remind me what we talked about last week?",
+    "my favourite food is actually ramen, please remember that",
+    "what was the name of the book you recommended?",
+    "I am travelling to Lisbon next month, any tips?",
+    "thanks, that was really helpful!"
+]
+TOOL_CALLS = [
+    ("send_message", lambda i: {"message": f"Sure, here is what I found for you ({i})."}),
+    ("core_memory_append", lambda i: {"label": "human", "content": f"Fact {i}: likes ramen.", "request_heartbeat": True}),
+    ("archival_memory_search", lambda i: {"query": f"conversation {i}", "page": 0, "request_heartbeat": True}),
+    ("conversation_search", lambda i: {"query": "book", "page": i % 3, "request_heartbeat": True})
+]
+
+def _text(text):
+    return {"type": "text", "text": text}
+
+def _message(created_at, role, content, tool_call_id=None, tool_calls=None, name=None):
+    """One message shaped like those in the bundled agent files"""
+    return {"created_at": created_at.isoformat(), "group_id": None, "model": "gpt-4-0613", "name": name,
+            "role": role, "content": content, "tool_call_id": tool_call_id, "tool_calls": tool_calls or [],
+            "tool_returns": [], "updated_at": created_at.isoformat(timespec="seconds")}
+
+def iter_synthetic_messages(count, seed=0):
+    """Yield `count` messages in user / assistant tool call / tool return turns"""
+    rng = random.Random(seed)
+    created_at = datetime(2025, 4, 1, 3, 47, 27)
+    idx = 0
+    while idx < count:
+        created_at += timedelta(seconds=rng.randint(1, 90))
+        user_text = json.dumps({"type": "user_message", "message": rng.choice(USER_MESSAGES),
+                                "time": created_at.strftime("%Y-%m-%d %I:%M:%S %p")}, indent=2)
+        turn = [_message(created_at, "user", [_text(user_text)])]
+        
+        tool_name, make_args = TOOL_CALLS[rng.randrange(len(TOOL_CALLS))]
+        call_id = f"call-{idx:08d}"
+        thought = "The user wants me to " + " ".join(rng.choice(USER_MESSAGES).split()[:rng.randint(3, 10)])
+        # Multi-part content: inner monologue followed by a second text part
+        content = [_text(thought), _text(f"Calling {tool_name} to continue.")]
+        tool_calls = [{"id": call_id, "type": "function",
+                       "function": {"name": tool_name, "arguments": json.dumps(make_args(idx), indent=2)}}]
+        turn.append(_message(created_at, "assistant", content, tool_calls=tool_calls, name="memgpt_agent"))
+        
+        result = json.dumps({"status": "OK", "message": None,
+                             "time": created_at.strftime("%Y-%m-%d %I:%M:%S %p")}, indent=2)
+        turn.append(_message(created_at, "tool", [_text(result)], tool_call_id=call_id, name=tool_name))
+        
+        for msg in turn[:count - idx]:
+            yield msg
+        idx += len(turn)
+
+def generate_agent_file(path, message_count, memory_kb=16, seed=0, template_file=TEMPLATE_FILE):
+    """Write a synthetic .af file with `message_count` messages to `path`
+    
+    The agent's settings and tools are copied from `template_file`, and each
+    memory block is grown to about `memory_kb` KB. Messages are written one at
+    a time, so even the largest files are generated in constant memory.
+    """
+    with open(template_file, "r", encoding="utf-8") as f:
+        agent = json.load(f)
+    
+    for block in agent.get("core_memory", []):
+        value = block.get("value") or block.get("label", "")
+        block["value"] = (value * (memory_kb * 1024 // max(len(value), 1) + 1))[:memory_kb * 1024]
+        block["limit"] = max(block.get("limit", 0), len(block["value"]))
+    agent["messages"] = []
+    agent["in_context_message_indices"] = list(range(max(message_count - 10, 0), message_count))
+    
+    # Write everything but the messages, then splice the messages into the empty array
+    header, tail = json.dumps(agent, indent=2).split('"messages": []', 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(header)
+        f.write('"messages": [')
+        for idx, msg in enumerate(iter_synthetic_messages(message_count, seed)):
+            f.write(",\n    " if idx else "\n    ")
+            f.write(json.dumps(msg))
+        f.write("\n  ]")
+        f.write(tail)
+    return path
+
+def measure(func, trace_memory):
+    """Run `func` once and return its result, wall time and peak traced memory"""
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+def benchmark_file(path, output_formats, output_dir, json_backend=None, streaming=False,
+                   compact=False, trace_memory=True, repeat=1):
+    """Time and memory-profile load, convert and save for one .af file
+    
+    Timings are the best of `repeat` runs without tracemalloc, since tracing
+    slows Python down several times. Peak memory comes from one traced run.
+    """
+    def run(trace):
+        stages = {}
+        
+        def add(stage, seconds, peak):
+            stages[stage] = {"seconds": seconds, "peak_bytes": peak}
+        
+        first_class = CONVERTERS[output_formats[0]]
+        loaded, seconds, peak = measure(
+            lambda: first_class(path, streaming=streaming, json_backend=json_backend), trace)
+        add("load", seconds, peak)
+        
+        for output_format in output_formats:
+            # A fresh normalization per target, as a single-format conversion does it
+            converter = CONVERTERS[output_format].from_converter(loaded)
+            converter.reset_normalization()
+            data, seconds, peak = measure(lambda: converter.convert(include_history=True), trace)
+            add(f"convert:{output_format}", seconds, peak)
+            
+            output_file = os.path.join(output_dir, f"benchmark_{output_format}.json")
+            payload, seconds, peak = measure(
+                lambda: converter.save(output_file, data, verbose=False, compact=compact), trace)
+            add(f"save:{output_format}", seconds, peak)
+            stages[f"save:{output_format}"]["output_bytes"] = len(payload)
+            del data, payload
+        
+        return stages, loaded.message_count
+    
+    stages, message_count = run(False)
+    for _ in range(repeat - 1):
+        for stage, values in run(False)[0].items():
+            stages[stage]["seconds"] = min(stages[stage]["seconds"], values["seconds"])
+    if trace_memory:
+        traced, _ = run(True)
+        for stage, values in traced.items():
+            stages[stage]["peak_bytes"] = values["peak_bytes"]
+    
+    for stage, values in stages.items():
+        values["messages_per_second"] = message_count / values["seconds"] if values["seconds"] else None
+    return {"messages": message_count, "input_bytes": os.path.getsize(path), "stages": stages}
+
+def git_revision():
+    """Return the current commit hash and whether the work tree has changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=project_dir, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no", "."], cwd=project_dir,
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def compare(results, baseline):
+    """Print the ratio of each stage time to the same stage in `baseline`"""
+    previous = {(run["messages"], stage): values["seconds"]
+                for run in baseline["results"] for stage, values in run["stages"].items()}
+    print(f"\nCompared with {(baseline.get('commit') or 'unknown')[:12]} (ratio > 1 is slower):")
+    for run in results:
+        for stage, values in run["stages"].items():
+            before = previous.get((run["messages"], stage))
+            if before:
+                print(f"  {run['messages']:>9,} {stage:<20} {values['seconds'] / before:>8.2f}x")
+
+def parse_sizes(value):
+    """Parse a comma separated list of message counts, allowing 1e6 notation"""
+    return [int(float(size)) for size in value.split(",") if size.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the converter on synthetic agent files")
+    parser.add_argument("--sizes", type=parse_sizes, default=DEFAULT_SIZES,
+                        help="Comma separated message counts (default: 100,1000,10000,100000; up to 1e6)")
+    parser.add_argument("--output-format", default="langchain,autogen",
+                        help="Comma separated target formats (default: langchain,autogen)")
+    parser.add_argument("--memory-kb", type=int, default=16, help="Size of each memory block in KB (default: 16)")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per file, best is kept (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic messages (default: 0)")
+    parser.add_argument("--work-dir", help="Where generated agent files are kept and reused (default: a temp dir)")
+    parser.add_argument("--json-backend", choices=["json", "orjson", "msgspec"], help="JSON backend to benchmark")
+    parser.add_argument("--streaming", action="store_true", help="Load agent files with the streaming reader")
+    parser.add_argument("--compact", action="store_true", help="Save output without indentation")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+    
+    output_formats = [fmt.strip() for fmt in args.output_format.split(",") if fmt.strip()]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="af_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+    commit, dirty = git_revision()
+    
+    print("=" * 80)
+    print(f"CONVERTER BENCHMARK ({(commit or 'unknown commit')[:12]}{' + local changes' if dirty else ''})")
+    print("=" * 80)
+    
+    results = []
+    for size in args.sizes:
+        path = os.path.join(work_dir, f"synthetic_{size}_m{args.memory_kb}_s{args.seed}.af")
+        if not os.path.exists(path):
+            print(f"\nGenerating {path}")
+            generate_agent_file(path, size, args.memory_kb, args.seed)
+        
+        result = benchmark_file(path, output_formats, work_dir, args.json_backend, args.streaming,
+                                args.compact, not args.no_memory, args.repeat)
+        results.append(result)
+        
+        print(f"\n{result['messages']:,} messages ({result['input_bytes'] / 1024 / 1024:.1f} MB)")
+        print(f"  {'stage':<20} {'seconds':>10} {'msgs/sec':>12} {'peak MB':>10}")
+        for stage, values in result["stages"].items():
+            peak = values["peak_bytes"]
+            print(f"  {stage:<20} {values['seconds']:>10.3f} {values['messages_per_second'] or 0:>12,.0f} "
+                  f"{peak / 1024 / 1024 if peak is not None else float('nan'):>10.1f}")
+    
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_backend": get_json_backend(args.json_backend).name,
+        "options": {"output_formats": output_formats, "memory_kb": args.memory_kb, "seed": args.seed,
+                    "repeat": args.repeat, "streaming": args.streaming, "compact": args.compact},
+        "results": results
+    }
+    
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+JSON Backend Benchmark
+
+This script compares the available JSON backends (stdlib json, orjson,
+msgspec) on the bundled .af sample files: parsing the agent file, writing the
+converted output indented and writing it compact.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(script_dir), "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from af_converter import JSON_BACKENDS, LangChainConverter, get_json_backend
+
+def best_time(func, repeat):
+    """Return the fastest of `repeat` runs of `func`, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_file(path, backends, repeat):
+    """Time load and save with each backend for one .af file"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    converted = LangChainConverter(path).convert()
+    
+    results = {}
+    for backend in backends:
+        results[backend.name] = {
+            "load": best_time(lambda: backend.loads(raw), repeat),
+            "dump_indent": best_time(lambda: backend.dumps(converted), repeat),
+            "dump_compact": best_time(lambda: backend.dumps(converted, compact=True), repeat),
+            "output_bytes_indent": len(backend.dumps(converted)),
+            "output_bytes_compact": len(backend.dumps(converted, compact=True))
+        }
+    return {"file": os.path.relpath(path, os.path.dirname(os.path.dirname(script_dir))),
+            "input_bytes": len(raw), "backends": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON backends on the bundled .af files")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per measurement, best is kept (default: 20)")
+    parser.add_argument("--output", help="Also write the raw results to this JSON file")
+    args = parser.parse_args()
+    
+    backends = []
+    for name in JSON_BACKENDS:
+        try:
+            backends.append(get_json_backend(name))
+        except ImportError:
+            print(f"Skipping {name}: not installed")
+    
+    project_dir = os.path.dirname(os.path.dirname(script_dir))
+    agent_files = sorted(glob.glob(os.path.join(project_dir, "*", "*.af")))
+    
+    print("=" * 80)
+    print("JSON BACKEND BENCHMARK (best of {} runs, milliseconds)".format(args.repeat))
+    print("=" * 80)
+    
+    results = []
+    for path in agent_files:
+        result = benchmark_file(path, backends, args.repeat)
+        results.append(result)
+        
+        print(f"\n{result['file']} ({result['input_bytes'] / 1024:.1f} KB)")
+        print(f"  {'backend':<10} {'load':>10} {'dump':>10} {'compact':>10} {'size':>10} {'compact':>10}")
+        for name, timings in result["backends"].items():
+            print(f"  {name:<10} {timings['load'] * 1000:>10.3f} {timings['dump_indent'] * 1000:>10.3f} "
+                  f"{timings['dump_compact'] * 1000:>10.3f} {timings['output_bytes_indent']:>10,} "
+                  f"{timings['output_bytes_compact']:>10,}")
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
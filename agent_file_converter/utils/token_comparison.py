@@ -3,70 +3,190 @@
 Token Comparison Script
 
 This script compares the token usage between context summary and full message history.
+
+Tokens are counted per section (system prompt, each memory block, each tool
+schema, context summary and history) with a pluggable tokenizer: a byte-level
+BPE tokenizer loaded from a local tiktoken-format vocab file when one is
+given, or the 4-characters-per-token heuristic otherwise.
 """
 
-import os
+import argparse
+import base64
 import json
-from af_converter import LangChainConverter
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(script_dir), "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from af_converter import LangChainConverter, AutoGenConverter, estimate_tokens
+
+# cl100k-style pre-tokenization. The `regex` module supports the exact
+# Unicode classes; the stdlib fallback approximates \p{L} and \p{N}.
+try:
+    import regex
+    PRETOKENIZE_PATTERN = regex.compile(
+        r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+    )
+except ImportError:
+    PRETOKENIZE_PATTERN = re.compile(
+        r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|(?:[^\r\n\w]|_)?[^\W\d_]+|\d{1,3}| ?(?:[^\s\w]|_)+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+    )
+
+class HeuristicTokenizer:
+    """Estimates tokens as one per 4 characters"""
+    
+    name = "heuristic"
+    
+    def count(self, text: str) -> int:
+        # The converter's own estimate, so both report the same counts
+        return estimate_tokens(text)
+
+class BPETokenizer:
+    """Byte-level BPE tokenizer using tiktoken-style mergeable ranks
+    
+    The vocab file has one `<base64 token> <rank>` pair per line, as in the
+    `.tiktoken` files published for cl100k_base and o200k_base.
+    """
+    
+    name = "bpe"
+    
+    def __init__(self, mergeable_ranks: Dict[bytes, int], cache_size: int = 100_000):
+        self.mergeable_ranks = mergeable_ranks
+        self._cache: Dict[bytes, List[int]] = {}
+        self._cache_size = cache_size
+    
+    @classmethod
+    def from_file(cls, vocab_path: str) -> "BPETokenizer":
+        """Load mergeable ranks from a tiktoken-format vocab file"""
+        ranks = {}
+        with open(vocab_path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+        return cls(ranks)
+    
+    def _bpe(self, piece: bytes) -> List[int]:
+        """Merge the bytes of one pre-token into vocab tokens"""
+        ranks = self.mergeable_ranks
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            # Merge the adjacent pair with the lowest rank first
+            best_rank = None
+            best_index = -1
+            for i in range(len(parts) - 1):
+                rank = ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+                    best_index = i
+            if best_rank is None:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+        return [ranks[part] for part in parts]
+    
+    def encode(self, text: str) -> List[int]:
+        """Encode text into token ids"""
+        tokens = []
+        for match in PRETOKENIZE_PATTERN.finditer(text):
+            piece = match.group().encode("utf-8")
+            cached = self._cache.get(piece)
+            if cached is None:
+                if piece in self.mergeable_ranks:
+                    cached = [self.mergeable_ranks[piece]]
+                else:
+                    cached = self._bpe(piece)
+                if len(self._cache) < self._cache_size:
+                    self._cache[piece] = cached
+            tokens.extend(cached)
+        return tokens
+    
+    def count(self, text: str) -> int:
+        return len(self.encode(text))
+
+def load_tokenizer(vocab_path: Optional[str] = None):
+    """Return a BPE tokenizer for `vocab_path` (or $AF_TOKENIZER_VOCAB), else the heuristic"""
+    vocab_path = vocab_path or os.environ.get("AF_TOKENIZER_VOCAB")
+    if vocab_path:
+        return BPETokenizer.from_file(vocab_path)
+    return HeuristicTokenizer()
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def _history_text(entry: Dict[str, Any]) -> str:
+    """Text a model would see for one LangChain or AutoGen history entry"""
+    data = entry.get("data", entry)
+    parts = [data.get("content") or ""]
+    for key in ("additional_kwargs", "function_call", "tool_call_id", "name"):
+        if data.get(key):
+            parts.append(data[key] if isinstance(data[key], str) else _compact(data[key]))
+    return "\n".join(parts)
+
+def count_sections(converted: Dict[str, Any], tokenizer) -> Dict[str, int]:
+    """Count tokens for each section of a converted agent, in memory"""
+    config = converted["config"]
+    counts = {"system_prompt": tokenizer.count(config.get("system_message", ""))}
+    for label, value in config.get("memory", {}).items():
+        counts[f"memory:{label}"] = tokenizer.count(value)
+    for tool in config.get("tools", []):
+        counts[f"tool:{tool.get('name', '')}"] = tokenizer.count(_compact(tool))
+    if "context_summary" in config:
+        counts["context_summary"] = tokenizer.count(config["context_summary"])
+    history = config.get("message_history", config.get("chat_history"))
+    if history is not None:
+        counts["history"] = sum(tokenizer.count(_history_text(entry)) for entry in history)
+    return counts
 
 def main():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
     project_dir = os.path.dirname(script_dir)
+    repo_dir = os.path.dirname(project_dir)
+    
+    parser = argparse.ArgumentParser(description="Compare token usage of context summary and full history")
+    parser.add_argument("--input", default=os.path.join(repo_dir, "memgpt_agent", "memgpt_agent_with_convo.af"),
+                        help="Agent file to analyse (default: the bundled MemGPT agent with conversation)")
+    parser.add_argument("--output-format", default="langchain", choices=["langchain", "autogen"],
+                        help="Target format to count tokens for (default: langchain)")
+    parser.add_argument("--vocab", help="tiktoken-format BPE vocab file (default: $AF_TOKENIZER_VOCAB, "
+                                        "else estimate 4 characters per token)")
+    args = parser.parse_args()
     
     # Path to the agent file with conversation
-    agent_path = os.path.join(project_dir, "memgpt_agent", "memgpt_agent_with_convo.af")
+    agent_path = args.input
     
     if not os.path.exists(agent_path):
         print(f"Error: Agent file not found at {agent_path}")
         return
     
+    tokenizer = load_tokenizer(args.vocab)
+    
     print("=" * 80)
     print("CONTEXT SUMMARY VS FULL HISTORY: TOKEN COMPARISON")
     print("=" * 80)
     
-    # Convert with context summary only
-    converter = LangChainConverter(agent_path)
-    summary_data = converter.convert()
-    
-    # Remove message history
-    if 'message_history' in summary_data['config']:
-        del summary_data['config']['message_history']
-    
-    summary_path = os.path.join(script_dir, "token_test_summary.json")
-    converter.save(summary_path, summary_data)
-    
-    # Convert with full history
-    history_data = converter.convert()  # Re-convert to get full data
-    history_path = os.path.join(script_dir, "token_test_history.json") 
-    converter.save(history_path, history_data)
+    converter_class = LangChainConverter if args.output_format == "langchain" else AutoGenConverter
+    converted = converter_class(agent_path, token_counter=tokenizer.count).convert()
+    counts = count_sections(converted, tokenizer)
     
-    # Calculate sizes
-    summary_size = os.path.getsize(summary_path)
-    history_size = os.path.getsize(history_path)
+    print(f"\nTokens per section ({tokenizer.name} tokenizer):")
+    for section, tokens in counts.items():
+        print(f"  {section:<40} {tokens:>10,}")
     
-    # Character counts in JSON
-    summary_chars = len(json.dumps(summary_data))
-    history_chars = len(json.dumps(history_data))
-    
-    # Approximate token counts (4 chars ≈ 1 token)
-    summary_tokens = summary_chars / 4
-    history_tokens = history_chars / 4
+    static_tokens = sum(tokens for section, tokens in counts.items()
+                        if section not in ("context_summary", "history"))
+    summary_tokens = static_tokens + counts.get("context_summary", 0)
+    history_tokens = summary_tokens + counts.get("history", 0)
     
     # Display results
-    print("\nFile Size Comparison:")
-    print(f"Context Summary: {summary_size / 1024:.2f} KB")
-    print(f"Full History:    {history_size / 1024:.2f} KB")
-    print(f"Reduction:       {(history_size - summary_size) / 1024:.2f} KB ({(history_size - summary_size) / history_size * 100:.2f}%)")
-    
-    print("\nCharacter Count Comparison:")
-    print(f"Context Summary: {summary_chars:,} characters")
-    print(f"Full History:    {history_chars:,} characters")
-    print(f"Reduction:       {history_chars - summary_chars:,} characters ({(history_chars - summary_chars) / history_chars * 100:.2f}%)")
-    
-    print("\nToken Usage Comparison (Estimated):")
-    print(f"Context Summary: ~{int(summary_tokens):,} tokens")
-    print(f"Full History:    ~{int(history_tokens):,} tokens")
-    print(f"Token Savings:   ~{int(history_tokens - summary_tokens):,} tokens ({(history_tokens - summary_tokens) / history_tokens * 100:.2f}%)")
+    print("\nToken Usage Comparison:")
+    print(f"Context Summary: {summary_tokens:,} tokens")
+    print(f"Full History:    {history_tokens:,} tokens")
+    print(f"Token Savings:   {history_tokens - summary_tokens:,} tokens ({(history_tokens - summary_tokens) / history_tokens * 100:.2f}%)")
     
     print("\nWith an LLM cost of $0.01 per 1K tokens (like GPT-4):")
     summary_cost = (summary_tokens / 1000) * 0.01
@@ -76,4 +196,4 @@ def main():
     print(f"Cost Savings:    ${history_cost - summary_cost:.4f} ({(history_cost - summary_cost) / history_cost * 100:.2f}%)")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
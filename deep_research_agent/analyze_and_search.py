@@ -10,10 +10,16 @@ def analyze_and_search_tool(agent_state: "AgentState", summary: str, gaps: List[
         gaps (List[str]): A list of gaps in the findings
         next_search_topic (str): A topic to search for more information
     """
-    from firecrawl import FirecrawlApp
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from concurrent.futures import TimeoutError as FuturesTimeoutError
     import requests
+    from requests.adapters import HTTPAdapter
+    import hashlib
     import json
     import os
+    import sqlite3
+    import threading
+    import time
 
     # Input validation
     if not next_search_topic or not isinstance(next_search_topic, str):
@@ -21,126 +27,337 @@ def analyze_and_search_tool(agent_state: "AgentState", summary: str, gaps: List[
 
     query = next_search_topic
 
+    # Endpoints can be pointed elsewhere, e.g. at a local stub server in tests
+    tavily_api_url = os.environ.get("TAVILY_API_URL", "https://api.tavily.com").rstrip("/")
+    firecrawl_api_url = os.environ.get("FIRECRAWL_API_URL", "https://api.firecrawl.dev").rstrip("/")
+    # Number of search results to extract, and how long each extraction may take
+    top_n = int(os.environ.get("RESEARCH_TOP_N", "5"))
+    url_timeout = float(os.environ.get("RESEARCH_URL_TIMEOUT", "60"))
+    # Optional deadline for the whole step, and whether findings are written to memory as they arrive
+    step_deadline = None
+    if os.environ.get("RESEARCH_STEP_DEADLINE"):
+        step_deadline = time.monotonic() + float(os.environ["RESEARCH_STEP_DEADLINE"])
+    stream_findings = os.environ.get("RESEARCH_STREAM_FINDINGS", "").lower() in ("1", "true", "yes")
+    max_workers = 8
+    # Search results and extracted pages are cached on disk; a TTL of 0 disables the cache
+    cache_path = os.environ.get(
+        "RESEARCH_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "deep_research", "cache.sqlite3")
+    )
+    cache_ttl = float(os.environ.get("RESEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+    cache_max_entries = int(os.environ.get("RESEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+    # A keep-alive session and a worker pool shared by every call in this process,
+    # so repeated research steps reuse connections and threads
+    shared = globals().setdefault("_analyze_and_search_shared", {})
+    session = shared.get("session")
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session = shared.setdefault("session", session)
+    executor = shared.get("executor")
+    if executor is None:
+        executor = shared.setdefault(
+            "executor", ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyze_and_search")
+        )
+
+    # One connection per cache file, shared by the worker threads under a lock
+    cache = None
+    if cache_ttl > 0:
+        caches = shared.setdefault("caches", {})
+        cache = caches.get(cache_path)
+        if cache is None:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            connection = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+            connection.commit()
+            cache = caches.setdefault(cache_path, (connection, threading.Lock()))
+
+    def cache_key(kind, *parts):
+        return kind + ":" + hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    # A broken cache only costs the network round-trips it would have saved
+    def cache_get(key):
+        if cache is None:
+            return None
+        connection, lock = cache
+        now = time.time()
+        try:
+            with lock:
+                row = connection.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > cache_ttl:
+                    connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    connection.commit()
+                    return None
+                connection.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+                connection.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Research cache read failed: {str(e)}")
+            return None
+
+    def cache_put(key, value):
+        if cache is None:
+            return
+        connection, lock = cache
+        now = time.time()
+        try:
+            with lock:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, created, used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, separators=(",", ":")), now, now),
+                )
+                # Drop expired entries, then the least recently used beyond the size bound
+                connection.execute("DELETE FROM cache WHERE created < ?", (now - cache_ttl,))
+                (count,) = connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+                if count > cache_max_entries:
+                    connection.execute(
+                        "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used LIMIT ?)",
+                        (count - cache_max_entries,),
+                    )
+                connection.commit()
+        except sqlite3.Error as e:
+            print(f"Research cache write failed: {str(e)}")
+
     # Check if TAVILY_API_KEY is set
     tavily_api_key = os.environ.get("TAVILY_API_KEY")
     if not tavily_api_key:
         raise ValueError("TAVILY_API_KEY environment variable is not set")
 
-    # Get tavily results with proper error handling
-    try:
-        response = requests.post(
-            "https://api.tavily.com/search",
-            headers={"Content-Type": "application/json", "Authorization": f"Bearer {tavily_api_key}"},
-            json={"query": query},
-            timeout=30,  # Add timeout to prevent hanging
-        )
+    # Get tavily results with proper error handling, unless this search was done recently
+    search_request = {"query": query, "max_results": max(top_n, 5)}
+    search_key = cache_key("search", tavily_api_url, json.dumps(search_request, sort_keys=True))
+    results = cache_get(search_key)
+    if results is None:
+        try:
+            response = session.post(
+                f"{tavily_api_url}/search",
+                headers={"Content-Type": "application/json", "Authorization": f"Bearer {tavily_api_key}"},
+                json=search_request,
+                timeout=30,  # Add timeout to prevent hanging
+            )
 
-        # Check for HTTP errors
-        response.raise_for_status()
+            # Check for HTTP errors
+            response.raise_for_status()
 
-        # Try to parse JSON response
-        try:
-            response_data = response.json()
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to decode Tavily API response as JSON: {str(e)}. Response text: {response.text[:100]}...")
+            # Try to parse JSON response
+            try:
+                response_data = response.json()
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Failed to decode Tavily API response as JSON: {str(e)}. Response text: {response.text[:100]}...")
 
-        # Check if the expected key exists
-        if "results" not in response_data:
-            available_keys = list(response_data.keys())
-            raise KeyError(f"Expected 'results' key not found in Tavily API response. Available keys: {available_keys}")
+            # Check if the expected key exists
+            if "results" not in response_data:
+                available_keys = list(response_data.keys())
+                raise KeyError(f"Expected 'results' key not found in Tavily API response. Available keys: {available_keys}")
 
-        results = response_data["results"]
+            results = response_data["results"]
 
-    except requests.exceptions.RequestException as e:
-        raise RuntimeError(f"Tavily API request failed: {str(e)}")
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Tavily API request failed: {str(e)}")
+        cache_put(search_key, results)
 
-    # Initialize the FirecrawlApp with your API key
+    # Firecrawl is called over its REST API on the shared session
     firecrawl_api_key = os.environ.get("FIRECRAWL_API_KEY")
     if not firecrawl_api_key:
         raise ValueError("FIRECRAWL_API_KEY environment variable is not set")
-
-    app = FirecrawlApp(api_key=firecrawl_api_key)
+    firecrawl_headers = {"Content-Type": "application/json", "Authorization": f"Bearer {firecrawl_api_key}"}
 
     # Extract and gather findings with error handling
     try:
-        current_findings = agent_state.memory.get_block("research").value
-        research_state = json.loads(current_findings)
+        research_block = agent_state.memory.get_block("research")
+        research_limit = getattr(research_block, "limit", None) or 50000
+        research_state = json.loads(research_block.value)
     except json.JSONDecodeError as e:
         raise ValueError(f"Failed to parse research state as JSON: {str(e)}")
     except Exception as e:
         raise RuntimeError(f"Failed to retrieve or parse research state: {str(e)}")
 
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-
     def extract_data(result, research_topic):
         if not result.get("url"):
             print(f"Skipping result with missing URL: {result}")
             return None
-        
+
+        # Pages already extracted with the same prompt are served from the cache
+        prompt = f"Extract key information about {research_topic}. Focus on facts, data, and expert opinions."
+        extract_key = cache_key("extract", firecrawl_api_url, result["url"], prompt)
+        data = cache_get(extract_key)
+        if data is not None:
+            return {"url": result["url"], "data": data}
+
+        # Every request and the polling share one deadline per URL, capped by the step deadline
+        deadline = time.monotonic() + url_timeout
+        if step_deadline is not None:
+            deadline = min(deadline, step_deadline)
+
+        def remaining():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError("extraction deadline reached")
+            return left
+
         try:
-            data = app.extract(
-                [result["url"]],
-                {
-                    "prompt": f"Extract key information about {research_topic}. Focus on facts, data, and expert opinions."
-                },
+            response = session.post(
+                f"{firecrawl_api_url}/v1/extract",
+                headers=firecrawl_headers,
+                json={"urls": [result["url"]], "prompt": prompt},
+                timeout=remaining(),
             )
-            return {"url": result["url"], "data": data["data"]}
+            response.raise_for_status()
+            job = response.json()
+            # Only the submission response carries the job id, status responses do not
+            job_id = job.get("id")
+
+            # Extraction runs as a job, polled with backoff until it completes
+            poll_interval = 0.25
+            while job.get("status") != "completed":
+                if job.get("success") is False or job.get("status") in ("failed", "cancelled"):
+                    raise RuntimeError(job.get("error") or f"extraction {job.get('status', 'failed')}")
+                time.sleep(min(poll_interval, remaining()))
+                poll_interval = min(poll_interval * 2, 2.0)
+                response = session.get(
+                    f"{firecrawl_api_url}/v1/extract/{job_id}", headers=firecrawl_headers, timeout=remaining()
+                )
+                response.raise_for_status()
+                job = response.json()
+
+            cache_put(extract_key, job["data"])
+            return {"url": result["url"], "data": job["data"]}
         except Exception as e:
             print(f"Failed to extract from {result['url']}: {str(e)}")
             return None
-    
+
+    def dumps(value):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+    def compact_research_state(state, limit, keep_newest):
+        """Serialize the state compactly, shrinking old findings until it fits well within `limit` characters
+
+        The `keep_newest` findings are only shortened if nothing else makes the state fit.
+        """
+        # Leave room for the findings of the next step
+        target = int(limit * 0.8)
+        excerpt_chars = 300
+        findings = state["findings"]
+        older = max(len(findings) - keep_newest, 0)
+        size = len(dumps(state))
+
+        def excerpt(finding):
+            """Cut a finding's data down to a short excerpt, returning the change in size"""
+            data = finding.get("data")
+            text = data if isinstance(data, str) else dumps(data)
+            if len(text) <= excerpt_chars:
+                return 0
+            before = len(dumps(finding))
+            finding["data"] = text[:excerpt_chars] + "..."
+            return len(dumps(finding)) - before
+
+        # First cut the oldest findings down to an excerpt of their data
+        for finding in findings[:older]:
+            if size <= target:
+                break
+            size += excerpt(finding)
+
+        # Then move the oldest findings out, keeping their URLs for citations
+        archived = state.setdefault("archived_urls", [])
+        archived_set = set(archived)
+        moved = 0
+        while size > target and moved < older:
+            url = findings[moved].get("url")
+            size -= len(dumps(findings[moved])) + 1
+            if url and url not in archived_set:
+                archived.append(url)
+                archived_set.add(url)
+                size += len(dumps(url)) + 1
+            moved += 1
+        del findings[:moved]
+
+        # As a last resort shorten the newest findings and drop the oldest summaries and archived URLs
+        value = dumps(state)
+        if len(value) > limit:
+            for finding in findings:
+                excerpt(finding)
+            value = dumps(state)
+        while len(value) > limit and (len(state["summaries"]) > 1 or archived):
+            if len(state["summaries"]) > 1:
+                del state["summaries"][0]
+            else:
+                del archived[0]
+            value = dumps(state)
+        return value
+
+    def commit(new_findings, keep_newest):
+        """Add findings to the research state and write it to the research block"""
+        try:
+            # Findings are deduplicated by URL; a page extracted again replaces its older finding
+            new_urls = {finding["url"] for finding in new_findings}
+            research_state["findings"] = [
+                finding for finding in research_state["findings"] if finding.get("url") not in new_urls
+            ] + [dict(finding) for finding in new_findings]
+            agent_state.memory.update_block_value(
+                label="research", value=compact_research_state(research_state, research_limit, keep_newest)
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to update research state: {str(e)}")
+
     # Main code
     findings = []
-    top_n = 3
     research_topic = research_state.get('topic', 'the given topic')
-    
-    # Create a thread pool and submit tasks
-    with ThreadPoolExecutor(max_workers=top_n) as executor:
-        # Submit tasks for each result up to top_n
-        future_to_url = {
-            executor.submit(extract_data, result, research_topic): result
-            for result in results[:top_n] if result.get("url")
-        }
-        
-        # Collect results as they complete
-        for future in as_completed(future_to_url):
-            result = future.result()
-            if result:
-                findings.append(result)
-
-    #findings = []
-    #top_n = 3
-    #count = 0
-
-    #for result in results:
-    #    # Validate URL
-    #    if not result.get("url"):
-    #        print(f"Skipping result with missing URL: {result}")
-    #        continue
-
-    #    try:
-    #        data = app.extract(
-    #            [result["url"]],
-    #            {
-    #                "prompt": f"Extract key information about {research_state.get('topic', 'the given topic')}. Focus on facts, data, and expert opinions."
-    #            },
-    #        )
-
-    #        findings.append({"url": result["url"], "data": data["data"]})
-    #        count += 1
-    #    except Exception as e:
-    #        print(f"Failed to extract from {result['url']}: {str(e)}")
-
-    #    if count >= top_n:
-    #        break
 
     # Update the state with error handling
     try:
-        research_state["findings"] += findings
         research_state["summaries"] += [summary]
         research_state["plan_step"] += 1
-        agent_state.memory.update_block_value(label="research", value=json.dumps(research_state, indent=2))
     except Exception as e:
         raise RuntimeError(f"Failed to update research state: {str(e)}")
 
+    # Submit extractions for each result up to top_n to the shared pool
+    future_to_url = {
+        executor.submit(extract_data, result, research_topic): result
+        for result in results[:top_n] if result.get("url")
+    }
+
+    # Collect results as they complete, committing each one right away when streaming.
+    # At the step deadline, extractions still running are given up and reported.
+    incomplete_urls = []
+    collected = set()
+
+    def collect(future):
+        collected.add(future)
+        result = future.result()
+        if result:
+            findings.append(result)
+            if stream_findings:
+                commit([result], len(findings))
+
+    try:
+        wait = None if step_deadline is None else max(step_deadline - time.monotonic(), 0)
+        for future in as_completed(future_to_url, timeout=wait):
+            collect(future)
+    except FuturesTimeoutError:
+        # Extractions that finished just before the deadline may not have been yielded yet
+        for future in future_to_url:
+            if future.done() and future not in collected:
+                collect(future)
+        for future, result in future_to_url.items():
+            if not future.done():
+                future.cancel()
+                incomplete_urls.append(result["url"])
+        print(f"Step deadline reached, {len(incomplete_urls)} page(s) not extracted: {incomplete_urls}")
+
+    # Record which pages are missing from this step, so they can be searched again
+    if incomplete_urls:
+        research_state["incomplete_urls"] = incomplete_urls
+    else:
+        research_state.pop("incomplete_urls", None)
+    commit([] if stream_findings else findings, len(findings))
+
     return findings
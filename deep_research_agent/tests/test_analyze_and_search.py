@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test Analyze and Search Tool
+
+Runs `analyze_and_search_tool` against a local stub of the Tavily and
+Firecrawl APIs, so no network access or API keys are needed.
+"""
+
+import concurrent.futures
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analyze_and_search import analyze_and_search_tool
+
+SLOW_URL = "https://example.com/slow"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Minimal Tavily search and Firecrawl extract endpoints"""
+    
+    jobs = {}
+    polls = {}
+    requests = []
+    
+    def _send(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests.append((self.path, request))
+        if self.path == "/search":
+            urls = [f"https://example.com/{i}" for i in range(4)] + [SLOW_URL]
+            self._send({"results": [{"url": url, "title": url} for url in urls]})
+        elif self.path == "/v1/extract":
+            job_id = str(len(self.jobs))
+            self.jobs[job_id] = request["urls"][0]
+            self._send({"success": True, "id": job_id})
+    
+    def do_GET(self):
+        job_id = self.path.rsplit("/", 1)[1]
+        url = self.jobs[job_id]
+        if url == SLOW_URL:
+            time.sleep(3)
+        # Like Firecrawl, status responses carry no job id, and each job is still processing on its first poll
+        self.polls[job_id] = self.polls.get(job_id, 0) + 1
+        if self.polls[job_id] == 1:
+            self._send({"success": True, "status": "processing"})
+            return
+        self._send({"success": True, "status": "completed", "data": {"summary": f"facts from {url}"}})
+    
+    def log_message(self, *args):
+        pass
+
+
+class Block:
+    def __init__(self, value, limit=50000):
+        self.value = value
+        self.limit = limit
+
+
+class Memory:
+    def __init__(self, blocks):
+        self.blocks = {label: Block(value) for label, value in blocks.items()}
+    
+    def get_block(self, label):
+        return self.blocks[label]
+    
+    def update_block_value(self, label, value):
+        if len(value) > self.blocks[label].limit:
+            raise ValueError(f"Value exceeds limit of {self.blocks[label].limit} characters")
+        self.blocks[label].value = value
+
+
+class AgentState:
+    def __init__(self, research_state):
+        self.memory = Memory({"research": json.dumps(research_state)})
+
+
+@pytest.fixture
+def stub_server(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setenv("TAVILY_API_URL", url)
+    monkeypatch.setenv("FIRECRAWL_API_URL", url)
+    monkeypatch.setenv("TAVILY_API_KEY", "test")
+    monkeypatch.setenv("FIRECRAWL_API_KEY", "test")
+    monkeypatch.setenv("RESEARCH_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    StubHandler.requests.clear()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def test_sources_are_extracted_concurrently_with_per_url_timeout(stub_server, monkeypatch):
+    monkeypatch.setenv("RESEARCH_TOP_N", "5")
+    monkeypatch.setenv("RESEARCH_URL_TIMEOUT", "1")
+    agent_state = AgentState({"topic": "pgvector", "summaries": [], "findings": [], "plan_step": 1})
+    
+    start = time.monotonic()
+    findings = analyze_and_search_tool(agent_state, "summary", [], "pgvector")
+    elapsed = time.monotonic() - start
+    
+    # The slow page is dropped at its timeout, the others are fetched in parallel
+    assert sorted(finding["url"] for finding in findings) == [f"https://example.com/{i}" for i in range(4)]
+    assert elapsed < 2.5
+    
+    research_state = json.loads(agent_state.memory.get_block("research").value)
+    assert research_state["findings"] == findings
+    assert research_state["summaries"] == ["summary"]
+    assert research_state["plan_step"] == 2
+    
+    # The second step reuses the pooled session
+    session = analyze_and_search_tool.__globals__["_analyze_and_search_shared"]["session"]
+    analyze_and_search_tool(agent_state, "other summary", [], "pgvector")
+    assert analyze_and_search_tool.__globals__["_analyze_and_search_shared"]["session"] is session
+
+
+def test_repeated_searches_and_extractions_are_cached(stub_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("RESEARCH_TOP_N", "4")
+    agent_state = AgentState({"topic": "pgvector", "summaries": [], "findings": [], "plan_step": 1})
+    
+    first = analyze_and_search_tool(agent_state, "summary", [], "pgvector")
+    requests_made = len(StubHandler.requests)
+    second = analyze_and_search_tool(agent_state, "summary", [], "pgvector")
+    
+    # No search or extraction request is repeated
+    assert len(StubHandler.requests) == requests_made
+    assert sorted(first, key=lambda finding: finding["url"]) == sorted(second, key=lambda finding: finding["url"])
+    
+    # A different search still reuses the pages extracted before
+    analyze_and_search_tool(agent_state, "summary", [], "postgres extensions")
+    assert [path for path, _ in StubHandler.requests[requests_made:]] == ["/search"]
+    
+    # The cache stays within its size bound
+    monkeypatch.setenv("RESEARCH_CACHE_MAX_ENTRIES", "2")
+    analyze_and_search_tool(agent_state, "summary", [], "vector databases")
+    with sqlite3.connect(str(tmp_path / "cache.sqlite3")) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 2
+
+
+def test_research_state_stays_compact_and_bounded(stub_server, monkeypatch):
+    monkeypatch.setenv("RESEARCH_TOP_N", "4")
+    old_findings = [{"url": f"https://old.example.com/{i}", "data": {"text": "x" * 1000}} for i in range(200)]
+    # A page found again replaces its older finding
+    old_findings.append({"url": "https://example.com/0", "data": {"text": "stale"}})
+    agent_state = AgentState({"topic": "pgvector", "summaries": ["s"] * 5, "findings": old_findings, "plan_step": 1})
+    
+    findings = analyze_and_search_tool(agent_state, "summary", [], "pgvector")
+    value = agent_state.memory.get_block("research").value
+    research_state = json.loads(value)
+    
+    assert len(value) <= 50000 * 0.8
+    assert "\n" not in value
+    urls = [finding["url"] for finding in research_state["findings"]]
+    assert len(urls) == len(set(urls))
+    # The newest findings are kept whole, the oldest were moved out or cut to an excerpt
+    assert research_state["findings"][-len(findings):] == findings
+    assert research_state["archived_urls"][0] == "https://old.example.com/0"
+    assert all(len(finding["data"]) <= 303 for finding in research_state["findings"][:-len(findings)])
+    assert research_state["summaries"][-1] == "summary"
+
+
+def test_streaming_commits_findings_and_stops_at_step_deadline(stub_server, monkeypatch):
+    monkeypatch.setenv("RESEARCH_TOP_N", "5")
+    monkeypatch.setenv("RESEARCH_URL_TIMEOUT", "10")
+    monkeypatch.setenv("RESEARCH_STEP_DEADLINE", "1")
+    monkeypatch.setenv("RESEARCH_STREAM_FINDINGS", "1")
+    agent_state = AgentState({"topic": "pgvector", "summaries": [], "findings": [], "plan_step": 1})
+    updates = []
+    update_block_value = agent_state.memory.update_block_value
+    
+    def record_update(label, value):
+        updates.append(json.loads(value))
+        update_block_value(label, value)
+    
+    monkeypatch.setattr(agent_state.memory, "update_block_value", record_update)
+    
+    start = time.monotonic()
+    findings = analyze_and_search_tool(agent_state, "summary", [], "pgvector")
+    elapsed = time.monotonic() - start
+    
+    # The step ends at its deadline rather than at the slow page's own timeout
+    assert elapsed < 2
+    assert len(findings) == 4
+    # Each finding is committed as it arrives, then the step is closed with the pages it gave up on
+    assert [len(update["findings"]) for update in updates] == [1, 2, 3, 4, 4]
+    assert "incomplete_urls" not in updates[0]
+    assert updates[-1]["incomplete_urls"] == [SLOW_URL]
+    assert updates[-1]["summaries"] == ["summary"]
+
+
+def test_pages_finished_at_the_deadline_are_not_lost(stub_server, monkeypatch):
+    monkeypatch.setenv("RESEARCH_TOP_N", "5")
+    monkeypatch.setenv("RESEARCH_URL_TIMEOUT", "10")
+    monkeypatch.setenv("RESEARCH_STEP_DEADLINE", "1")
+    
+    # Time out without yielding futures that completed in the meantime
+    def as_completed(futures, timeout=None):
+        concurrent.futures.wait(futures, timeout)
+        raise concurrent.futures.TimeoutError()
+        yield
+    
+    monkeypatch.setattr(concurrent.futures, "as_completed", as_completed)
+    agent_state = AgentState({"topic": "pgvector", "summaries": [], "findings": [], "plan_step": 1})
+    findings = analyze_and_search_tool(agent_state, "summary", [], "pgvector")
+    
+    assert sorted(finding["url"] for finding in findings) == [f"https://example.com/{i}" for i in range(4)]
+    research_state = json.loads(agent_state.memory.get_block("research").value)
+    assert len(research_state["findings"]) == 4
+    assert research_state["incomplete_urls"] == [SLOW_URL]